@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Compares a new connection per jsonrpc request, as FortiManager.make_request used to send, with the pooled keep-alive
+session it now uses. A local HTTP server stands in for the FortiManager, so the difference measured is the TCP setup
+per request; a real FortiManager over HTTPS also saves a TLS handshake per request.
+
+Usage: python bench/pool_benchmark.py [--requests 500]
+"""
+
+import argparse
+import json
+import threading
+import time
+import requests
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class JsonRpcHandler(BaseHTTPRequestHandler):
+    """
+    This is the class used to answer every jsonrpc request with a successful status, keeping connections alive.
+    """
+    protocol_version = "HTTP/1.1"
+    # send each response as soon as it is written, as a FortiManager does
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content = json.dumps({"result": [{"status": {"code": 0, "message": "OK"}, "url": "/sys/status"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class JsonRpcServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def run(post, url, count):
+    """
+    This function is used to send count requests using post and return the number of seconds taken.
+    """
+    body = {"method": "get", "params": [{"url": "/sys/status"}], "session": "benchmark"}
+    start = time.time()
+    for request in range(count):
+        post(url, json=body).json()
+
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", default=500, type=int, help="the number of requests sent by each client")
+    args = parser.parse_args()
+
+    server = JsonRpcServer(("127.0.0.1", 0), JsonRpcHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = "http://127.0.0.1:{}/jsonrpc".format(server.server_address[1])
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=10)
+    session.mount("http://", adapter)
+
+    per_request = run(requests.post, url, args.requests)
+    pooled = run(session.post, url, args.requests)
+    server.shutdown()
+
+    print("requests: {}".format(args.requests))
+    print("new connection per request: {:.3f}s ({:.2f}ms/request)".format(per_request,
+                                                                          per_request * 1000 / args.requests))
+    print("pooled keep-alive session:  {:.3f}s ({:.2f}ms/request)".format(pooled, pooled * 1000 / args.requests))
+    print("speedup: {:.2f}x".format(per_request / pooled))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2946 @@
+#!/usr/bin/python
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+ANSIBLE_METADATA = {
+    "metadata_version": "1.0",
+    "status": ["preview"],
+    "supported_by": "community"
+}
+
+DOCUMENTATION = '''
+---
+module: fortimgr_adom_state
+version_added: "2.3"
+short_description: Converges the objects, routes, and policies of an ADOM to a desired state
+description:
+  - Manages the Address, Address Group, Service, Service Group, VIP, VIP Group, IP Pool, static route, and policy
+    configurations of an ADOM in a single task using jsonrpc API.
+  - The existing configuration of each endpoint is retrieved once, a plan of changes is computed locally, and the plan
+    is applied using batched requests under a single lock and commit.
+  - Changes are ordered in layers using the references between objects (member, srcaddr, dstaddr, service, and
+    poolname), so objects are added before the groups, routes, and policies that reference them, and deleted after
+    them. The changes in each layer are sent together in batched requests.
+  - Objects that exist on the FortiManager but are not in the desired state are left unchanged.
+  - Several ADOMs can be converged to the same desired state in parallel using adoms, each with its own session and
+    lock, so a rollout takes as long as the slowest ADOM instead of the sum of every ADOM.
+author: Jacob McGill (@jmcgill298)
+options:
+  adom:
+    description:
+      - The ADOM the configuration should belong to.
+      - Either adom or adoms is required.
+    required: false
+    type: str
+  adoms:
+    description:
+      - The ADOMs to converge to the desired state in parallel, instead of a single adom.
+      - Each item is either the name of an ADOM or a dictionary with the adom and package keys; package defaults to the
+        package param.
+      - Each ADOM is converged using its own login session and lock, so session_id, session_cache, broker_socket, and
+        lease_file can not be used with adoms.
+      - Routes can not be used with adoms, as the static routes of a FortiGate are not part of an ADOM's
+        configuration; every ADOM would add the same route to the FortiGate, outside of its own lock.
+      - The result of each ADOM is returned in adoms, and the module fails if any ADOM fails.
+    required: false
+    type: list
+  broker_socket:
+    description:
+      - The path of the Unix socket of a broker started with fortimgr_broker.
+      - Requests are forwarded through the broker, which holds pooled connections and sessions to the FortiManager.
+      - Requests are sent directly to the FortiManager if the broker is not running.
+    required: false
+    type: str
+  forks:
+    description:
+      - The maximum number of ADOMs in adoms converged at the same time.
+    required: false
+    default: 5
+    type: int
+  host:
+    description:
+      - The FortiManager's Address.
+    required: true
+    type: str
+  lease_file:
+    description:
+      - The path of the lease file of a workspace transaction started by fortimgr_lock.
+      - The task uses the transaction's session if session_id is not given, and does not lock the ADOM, as the
+        transaction is saved and unlocked by fortimgr_lock.
+      - The successful writes sent by the task are counted in the transaction.
+    required: false
+    type: str
+  lock:
+    description:
+      - True locks the ADOM, makes necessary configuration updates, saves the config, and unlocks the ADOM
+    required: false
+    default: True
+    type: bool
+  lock_timeout:
+    description:
+      - The number of seconds to keep retrying to lock the ADOM while it is locked by another session, waiting a
+        jittered, exponentially increasing interval between attempts.
+      - The default of 0 fails on the first unsuccessful attempt.
+      - If the ADOM can not be locked, the lock info of the session holding the lock is returned as lock_holder.
+    required: false
+    default: 0
+    type: int
+  package:
+    description:
+      - The policy package the policies in the desired state belong to.
+      - Required when the desired state has policies.
+    required: false
+    type: str
+  password:
+    description:
+      - The password associated with the username account.
+    required: false
+    type: str
+  pool_size:
+    description:
+      - The maximum number of keep-alive connections held open to the FortiManager.
+    required: false
+    default: 10
+    type: int
+  port:
+    description:
+      - The TCP port used to connect to the FortiManager if other than the default used by the transport
+        method(http=80, https=443).
+    required: false
+    type: int
+  provider:
+    description:
+      - Dictionary which acts as a collection of arguments used to define the characteristics
+        of how to connect to the device.
+      - Arguments hostname, username, and password must be specified in either provider or local param.
+      - Local params take precedence, e.g. hostname is preferred to provider["hostname"] when both are specified.
+    required: false
+    type: dict
+  rollback:
+    description:
+      - The rollback policy used when an ADOM in adoms fails. Changes are rolled back by unlocking the ADOM without
+        saving, so the lock param must be True for changes to be rolled back.
+      - all holds the changes of every ADOM in its locked workspace until all ADOMs are applied; the ADOMs are then
+        saved, or every ADOM is unlocked without saving if any ADOM failed.
+      - failed saves each ADOM as soon as its changes are applied, and only rolls back the ADOMs that failed.
+    required: false
+    default: all
+    type: str
+    choices: ["all", "failed"]
+  session_cache:
+    description:
+      - The path of a file used to share login sessions with other tasks connecting to the same host with the same
+        username.
+      - A cached session is reused while it is valid and is replaced by a new login once it is older than
+        session_cache_ttl.
+      - Tasks using the cache do not logout, so the session remains available to later tasks; use fortimgr_lock with
+        logout to end it.
+      - Tasks that lock the ADOM login with a private session, as the workspace lock belongs to the session.
+    required: false
+    type: str
+  session_cache_ttl:
+    description:
+      - The number of seconds a session stored in session_cache is reused before it is logged out and replaced by a
+        new login.
+    required: false
+    default: 3600
+    type: int
+  session_id:
+    description:
+      - The session_id of an established and active session
+    required: false
+    type: str
+  state:
+    description:
+      - The desired state of the objects in the desired state.
+      - absent will delete each object that exists, only requiring the keys used to identify the object.
+      - present will add each object that does not exist and update those that differ.
+    required: false
+    default: present
+    type: str
+    choices: ["absent", "present"]
+  timeout:
+    description:
+      - The number of seconds to wait for the FortiManager to accept a connection or respond to a request.
+      - The default waits indefinitely.
+    required: false
+    type: int
+  use_ssl:
+    description:
+      - Determines whether to use HTTPS(True) or HTTP(False).
+    required: false
+    default: True
+    type: bool
+  username:
+    description:
+      - The username used to authenticate with the FortiManager.
+    required: false
+    type: str
+  validate_certs:
+    description:
+      - Determines whether to validate certs against a trusted certificate file (True), or accept all certs (False)
+    required: false
+    default: False
+    type: bool
+  desired_state:
+    description:
+      - The desired state of the ADOM, a dictionary with any of the keys addresses, address_groups, services,
+        service_groups, vips, vip_groups, ip_pools, routes, and policies.
+      - Each key is a list of configuration dictionaries using the FortiManager API field names, such as
+        "associated-interface" and "member".
+      - Objects and policies are identified by their name; policies must be named to be managed by this module.
+      - Routes are identified by their destination (dst or dstaddr) and gateway, and each route must also have the
+        fortigate and vdom keys; vdom defaults to root.
+      - List fields are appended to unless the field only makes sense as a whole, such as an Address subnet or a VIP
+        extip, in which case the list is replaced.
+      - Either desired_state or src is required.
+    required: false
+    type: dict
+  src:
+    description:
+      - The path of a YAML or JSON file with the desired state.
+      - Either desired_state or src is required.
+    required: false
+    type: str
+'''
+
+EXAMPLES = '''
+- name: Converge ADOM
+  fortimgr_adom_state:
+    host: "{{ inventory_hostname }}"
+    username: "{{ username }}"
+    password: "{{ password }}"
+    adom: "lab"
+    package: "lab"
+    desired_state:
+      addresses:
+        - name: "server01"
+          type: "ipmask"
+          subnet:
+            - "10.1.1.1"
+            - "255.255.255.255"
+        - name: "server02"
+          type: "ipmask"
+          subnet:
+            - "10.1.1.2"
+            - "255.255.255.255"
+      address_groups:
+        - name: "servers"
+          member:
+            - "server01"
+            - "server02"
+      routes:
+        - fortigate: "Prod"
+          vdom: "root"
+          dst:
+            - "10.1.1.0"
+            - "255.255.255.0"
+          gateway: "10.0.0.1"
+          device: "port2"
+      policies:
+        - name: "servers"
+          srcintf:
+            - "any"
+          dstintf:
+            - "any"
+          srcaddr:
+            - "all"
+          dstaddr:
+            - "servers"
+          service:
+            - "HTTPS"
+          schedule:
+            - "always"
+          action: "accept"
+- name: Converge ADOM from a File
+  fortimgr_adom_state:
+    host: "{{ inventory_hostname }}"
+    username: "{{ username }}"
+    password: "{{ password }}"
+    adom: "lab"
+    package: "lab"
+    src: "./lab.yml"
+- name: Show the Plan without Applying it
+  fortimgr_adom_state:
+    host: "{{ inventory_hostname }}"
+    username: "{{ username }}"
+    password: "{{ password }}"
+    adom: "lab"
+    package: "lab"
+    src: "./lab.yml"
+  check_mode: True
+- name: Delete Objects and the Policies Referencing them
+  fortimgr_adom_state:
+    host: "{{ inventory_hostname }}"
+    username: "{{ username }}"
+    password: "{{ password }}"
+    adom: "lab"
+    package: "lab"
+    state: "absent"
+    desired_state:
+      addresses:
+        - name: "server01"
+        - name: "server02"
+      address_groups:
+        - name: "servers"
+      policies:
+        - name: "servers"
+- name: Roll out a Desired State to several ADOMs
+  fortimgr_adom_state:
+    host: "{{ inventory_hostname }}"
+    username: "{{ username }}"
+    password: "{{ password }}"
+    adoms:
+      - "us-east"
+      - "us-west"
+      - adom: "emea"
+        package: "emea-edge"
+    package: "edge"
+    forks: 10
+    rollback: "all"
+    src: "./edge.yml"
+'''
+
+RETURN = '''
+adoms:
+    description: The result of each ADOM when adoms is used, in the order the ADOMs were given. The status is one of
+                 unchanged, planned (check mode), applied (lock False), saved, discarded (rolled back because another
+                 ADOM failed), or failed; elapsed is the number of seconds spent converging the ADOM.
+    returned: When adoms is used
+    type: list
+    sample: [{"adom": "us-east", "changed": true, "config": [{"method": "add", "params": [{"data": {"name": "server02",
+             "subnet": ["10.1.1.2", "255.255.255.255"], "type": "ipmask"},
+             "url": "/pm/config/adom/us-east/obj/firewall/address"}]}], "elapsed": 3.12, "lock_wait": 0.0,
+             "locked": true, "package": "edge", "saved": true, "status": "saved", "summary": {"addresses": {"added": 1,
+             "deleted": 0, "unchanged": 1, "updated": 0}}, "unlocked": true}]
+config:
+    description: The batched requests that were pushed to the FortiManager, in the order they were sent.
+    returned: When adom is used
+    type: list
+    sample: [{"method": "add", "params": [{"data": {"name": "server02", "subnet": ["10.1.1.2", "255.255.255.255"],
+             "type": "ipmask"}, "url": "/pm/config/adom/lab/obj/firewall/address"}]}, {"method": "update", "params": [{
+             "data": {"member": ["server01", "server02"], "name": "servers"},
+             "url": "/pm/config/adom/lab/obj/firewall/addrgrp"}]}]
+summary:
+    description: The number of objects added, updated, deleted, and left unchanged for each key of the desired state.
+    returned: When adom is used
+    type: dict
+    sample: {"address_groups": {"added": 0, "deleted": 0, "unchanged": 0, "updated": 1},
+             "addresses": {"added": 1, "deleted": 0, "unchanged": 1, "updated": 0}}
+locked:
+    description: The status of the ADOM lock command
+    returned: When lock set to True
+    type: bool
+    sample: True
+lock_wait:
+    description: The number of seconds spent waiting to lock the ADOM.
+    returned: When lock set to True
+    type: float
+    sample: 4.21
+saved:
+    description: The status of the ADOM save command
+    returned: When lock set to True
+    type: bool
+    sample: True
+unlocked:
+    description: The status of the ADOM unlock command
+    returned: When lock set to True
+    type: bool
+    sample: True
+'''
+
+import fcntl
+import hashlib
+import json
+import os
+import random
+import socket
+import threading
+import time
+import requests
+import yaml
+from ansible.module_utils.basic import AnsibleModule, env_fallback, return_values
+
+requests.packages.urllib3.disable_warnings()
+
+
+class FortiManager(object):
+    """
+    This is the Base Class for FortiManager modules. All methods common across several FortiManager Classes should be
+    defined here and inherited by the sub-class.
+    """
+
+    # list fields that are replaced instead of appended to; the order of these lists is significant for config hashes
+    replace_fields = []
+
+    def __init__(self, host, user, passw, use_ssl=True, verify=False, adom="", package="", api_endpoint="", **kwargs):
+        """
+        :param host: Type str.
+                     The IP or resolvable hostname of the FortiManager.
+        :param user: Type str.
+                     The username used to authenticate with the FortiManager.
+        :param passw: Type str.
+                      The password associated with the user account.
+        :param use_ssl: Type bool.
+                        The default is True, which uses HTTPS instead of HTTP.
+        :param verify: Type bool.
+                       The default is False, which does not verify the certificate against the list of trusted
+                       certificates.
+        :param adom: Type str.
+                     The FortiManager ADOM which the configuration should belong to.
+        :param package: Type str.
+                        The FortiManager policy package that should be used.
+        :param api_endpoint: Type str.
+                             The API endpoint used for a particular configuration section.
+        :param kwargs: Type dict. Currently supports port, pool_size, timeout, session_cache, session_cache_ttl,
+                       broker_socket, hash_cache, lock_timeout, and lease_file.
+        :param headers: Type dict.
+                        The headers to include in HTTP requests.
+        :param port: Type str.
+                     Passing the port parameter will override the default HTTP(S) port when making requests.
+        :param pool_size: Type int.
+                          The maximum number of keep-alive connections held open to the FortiManager. The default is 10.
+        :param timeout: Type int or tuple.
+                        The connect and read timeout in seconds used for each request; a (connect, read) tuple can be
+                        used to set them independently. The default is None, which waits indefinitely.
+        :param session_cache: Type str.
+                              The path of a file used to share login sessions across module runs. Sessions are keyed
+                              by host, port, and user, and are not logged out by the logout method.
+        :param session_cache_ttl: Type int.
+                                  The number of seconds a cached session is reused before it is logged out and replaced
+                                  by a new login. The default is 3600.
+        :param broker_socket: Type str.
+                              The path of the Unix socket of a running fortimgr_broker. Requests are forwarded through
+                              the broker, and are sent directly to the FortiManager if the broker is not running.
+        :param hash_cache: Type str.
+                           The path of a file used to store the hash of the configuration last applied to each object,
+                           so unchanged objects can be skipped without retrieving them from the FortiManager.
+        :param lock_timeout: Type int.
+                             The number of seconds the config_lock method keeps retrying to lock the ADOM while it is
+                             locked by another session. The default is 0, which fails on the first unsuccessful attempt.
+        :param lease_file: Type str.
+                           The path of the lease file of a workspace transaction started by fortimgr_lock. Each
+                           successful write sent by the instance is counted in the lease file.
+        """
+        self.host = host
+        self.user = user
+        self.passw = passw
+        self.verify = verify
+        self.api_endpoint = api_endpoint
+        self.adom = adom
+        self.package = package
+        self.dvmdb_url = "/dvmdb/adom/{}/".format(self.adom)
+        self.obj_url = "/pm/config/adom/{}/obj/firewall/{}".format(self.adom, self.api_endpoint)
+        self.pkg_url = "/pm/config/adom/{}/pkg/{}/firewall/{}".format(self.adom, self.package, self.api_endpoint)
+        self.wsp_url = "/dvmdb/adom/{}/workspace/".format(self.adom)
+        self.headers = {"Content-Type": "application/json"}
+        self.port = kwargs.get("port", "")
+        self.pool_size = kwargs.get("pool_size", 10)
+        self.timeout = kwargs.get("timeout")
+        self.session_cache = kwargs.get("session_cache")
+        self.session_cache_ttl = kwargs.get("session_cache_ttl", 3600)
+        self.session_cache_key = "{}:{}:{}".format(self.host, self.port, self.user)
+        self.shared_session = False
+        self.broker_socket = kwargs.get("broker_socket")
+        self.brokered = False
+        self.hash_cache = kwargs.get("hash_cache")
+        self.lock_timeout = kwargs.get("lock_timeout") or 0
+        self.lock_wait = 0
+        self.lease_file = kwargs.get("lease_file")
+
+        port = ":{}".format(self.port) if self.port else ""
+        if use_ssl:
+            self.url = "https://{fw}{port}/jsonrpc".format(port=port, fw=self.host)
+        else:
+            self.url = "http://{fw}{port}/jsonrpc".format(port=port, fw=self.host)
+
+        # keep-alive connection pool shared by every request made by the instance
+        self.http_session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.http_session.mount("https://", adapter)
+        self.http_session.mount("http://", adapter)
+        self.http_session.headers.update(self.headers)
+        self.http_session.verify = self.verify
+
+    def add_config(self, new_config):
+        """
+        This method is used to submit a configuration request to the FortiManager. Only the object configuration details
+        need to be provided; all other parameters that make up the API request body will be handled by the method.
+
+        :param new_config: Type list.
+                           The "data" portion of the configuration to be submitted to the FortiManager.
+        :return: The response from the API request to add the configuration.
+        """
+        body = {"method": "add", "params": [{"url": self.obj_url, "data": new_config, "session": self.session}]}
+        response = self.make_request(body)
+
+        return response
+
+    def config_absent(self, module, proposed, existing):
+        """
+        This function is used to determine the appropriate configuration to remove from the FortiManager when the
+        "state" parameter is set to "absent" and to collect the dictionary data that will be returned by the Ansible
+        Module.
+
+        :param module: The AnsibleModule instance.
+        :param proposed: The proposed config to send to the FortiManager.
+        :param existing: The existing configuration for the item on the FortiManager (using the "name" key to get item).
+        :return: A dictionary containing the module exit values.
+        """
+        changed = False
+        config = {}
+
+        if existing:
+            # check if proposed is to remove a dynamic_mapping
+            if "dynamic_mapping" not in proposed:
+                config = self.config_delete(module, proposed["name"])
+                changed = True
+            else:
+                diff = self.get_diff_mappings(proposed, existing)
+                if diff:
+                    config = self.config_update(module, diff)
+                    changed = True
+
+        return {"changed": changed, "config": config, "existing": existing}
+
+    def config_bulk(self, module, adds=[], updates=[], deletes=[]):
+        """
+        This method is used to handle the logic for Ansible modules that change many objects at once. The ADOM is locked
+        once if the lock param is set to True, the changes are sent using batched requests, and the configuration is
+        saved and unlocked once all changes succeed. If any change fails, the ADOM is unlocked without saving and the
+        module fails with the list of changes that failed.
+
+        :param module: The Ansible Module instance started by the task.
+        :param adds: Type list.
+                     The config dictionaries of the objects to add.
+        :param updates: Type list.
+                        The config dictionaries of the object updates, as returned by the get_diff methods.
+        :param deletes: Type list.
+                        The names of the objects to delete.
+        :return: A list of dictionaries that correspond to the configuration that was sent in the request bodies to the
+                 FortiManager API. This list will map to the "config" key returned by the Ansible Module.
+        """
+        changes = [("add", [{"url": self.obj_url, "data": add} for add in adds], [add["name"] for add in adds]),
+                   ("update", [{"url": self.obj_url, "data": update} for update in updates],
+                    [update["name"] for update in updates]),
+                   ("delete", [{"url": self.obj_url + "/{}".format(name)} for name in deletes], deletes)]
+        changes = [change for change in changes if change[1]]
+
+        # lock config if set and module not in check mode
+        if module.params["lock"] and not module.check_mode:
+            self.config_lock(module)
+
+        # configure if not in check mode
+        if not module.check_mode:
+            failed = []
+            for method, params, names in changes:
+                results = self.make_batch_request(method, params)
+                for name, result in zip(names, results):
+                    if result["status"]["code"] != 0:
+                        failed.append(dict(method=method, name=name, status=result["status"]))
+
+            # attempt to unlock without saving if any change was unsuccessful
+            if failed and module.params["lock"]:
+                self.config_unlock(module, msg=failed, saved=False)
+                module.fail_json(msg="Unable to Apply all Changes", failed=failed, locked=True, saved=False,
+                                 unlocked=True)
+            elif failed:
+                module.fail_json(msg="Unable to Apply all Changes", failed=failed)
+            elif module.params["lock"]:
+                self.config_commit(module)
+
+        return [{"method": method, "params": params} for method, params, names in changes]
+
+    def config_commit(self, module):
+        """
+        This method is used to save the configuration and unlock the ADOM when "lock" is set to True. The commit and
+        unlock are sent as two params of a single "exec" request, which the FortiManager runs in order, so the ADOM is
+        unlocked even if the save fails. The result of each step is checked separately, so the module fails with the
+        same message and locked, saved, and unlocked values as when config_save and config_unlock are used.
+
+        :param module: The Ansible Module instance started by the task.
+        :return: True if the configuration was saved and the ADOM unlocked.
+        """
+        save_status, unlock_status = self.save_unlock()["result"]
+        saved = save_status["status"]["code"] == 0
+        unlocked = unlock_status["status"]["code"] == 0
+        if saved and unlocked:
+            return True
+        elif unlocked:
+            msg = "Unable to Save Config, Successfully Unlocked"
+        elif saved:
+            msg = "Config Saved, but Unable to Unlock"
+        else:
+            msg = "Config Updated, but Unable to Save or Unlock"
+
+        # try to logout before failing
+        self.logout()
+        module.fail_json(msg=msg, locked=True, saved=saved, unlocked=unlocked)
+
+    def config_delete(self, module, name):
+        """
+        This method is used to handle the logic for Ansible modules when the "state" is set to "absent" and only the
+        name is provided as input into the Ansible Module. The config_lock is used to lock the configuration if the lock
+        param is set to True. The config_response method is used to handle the logic from the response to delete the
+        object.
+
+        :param module: The Ansible Module instance started by the task.
+        :param name: Type str.
+                     The name of the object to be removed from the FortiManager.
+        :return: A dictionary that corresponds to the configuration that was sent in the request body to the
+                 FortiManager API. This dict will map to the "config" key returned by the Ansible Module.
+        """
+        # lock config if set and module not in check mode
+        if module.params["lock"] and not module.check_mode:
+            self.config_lock(module)
+
+        # configure if not in check mode
+        if not module.check_mode:
+            response = self.delete_config(name)
+            self.config_response(module, response.json(), module.params["lock"])
+
+        return {"method": "delete", "params": [{"url": self.obj_url + "/{}".format(name)}]}
+
+    def config_lock(self, module, msg="Unable to Lock the Configuration; Validate the ADOM is not Currently Locked.",
+                    max_interval=30):
+        """
+        This method is used to handle the logic for Ansible modules for locking the ADOM when "lock" is set to True. The
+        lock method is used to make the request to the FortiManager. Unsuccessful attempts are retried until
+        lock_timeout seconds have passed, waiting a random time of up to an exponentially increasing interval between
+        attempts so parallel tasks do not retry in step. The number of seconds spent waiting is stored in lock_wait,
+        and the lock info of the ADOM is returned as lock_holder if the ADOM can not be locked. If the session is shared
+        through session_cache or the broker, a private session is logged in first, so other tasks using the shared
+        session do not write to the locked workspace or release the lock.
+
+        :param module: The Ansible Module instance started by the task.
+        :param msg: Type str.
+                    A message for the module to return upon failure.
+        :param max_interval: Type int.
+                             The maximum number of seconds to wait between attempts.
+        :return: True if lock successful.
+        """
+        # the workspace lock belongs to the session, so a session shared with other tasks is replaced by a private one
+        if self.shared_session:
+            login = self.login(private=True)
+            if login.json()["result"][0]["status"]["code"] != 0:
+                module.fail_json(msg="Unable to Login with a Private Session to Lock the ADOM", locked=False,
+                                 saved=False, unlocked=False)
+
+        clock = getattr(time, "monotonic", time.time)
+        start = clock()
+        interval = 1
+        lock_status = self.lock()
+        while lock_status["result"][0]["status"]["code"] != 0:
+            remaining = start + self.lock_timeout - clock()
+            if remaining <= 0:
+                self.lock_wait = round(clock() - start, 2)
+                lock_holder = self.get_lock_info()
+                # try to logout before failing
+                self.logout()
+                module.fail_json(msg=msg, locked=False, saved=False, unlocked=False, lock_wait=self.lock_wait,
+                                 lock_holder=lock_holder)
+
+            time.sleep(min(random.uniform(0, interval), remaining))
+            interval = min(interval * 2, max_interval)
+            lock_status = self.lock()
+
+        self.lock_wait = round(clock() - start, 2)
+
+        return True
+
+    def config_new(self, module, new_config):
+        """
+        This method is used to handle the logic for Ansible modules when the "state" is set to "present" and their is
+        not currently an object of the same type with the same name. The config_lock is used to lock the configuration
+        if the lock param is set to True. The config_response method is used to handle the logic from the response to
+        create the object.
+
+        :param module: The Ansible Module instance started by the task.
+        :param new_config: Type dict.
+                           The config dictionary with the objects configuration to send to the FortiManager API. This
+                           corresponds to the "data" portion of the request body.
+        :return: A dictionary that corresponds to the configuration that was sent in the request body to the
+                 FortiManager API. This dict will map to the "config" key returned by the Ansible Module.
+        """
+        # lock config if set and module not in check mode
+        if module.params["lock"] and not module.check_mode:
+            self.config_lock(module)
+
+        # configure if not in check mode
+        if not module.check_mode:
+            response = self.add_config(new_config)
+            self.config_response(module, response.json(), module.params["lock"])
+
+        return {"method": "add", "params": [{"url": self.obj_url, "data": new_config}]}
+
+    def config_param_absent(self, module, proposed, existing):
+        """
+        This function is used to determine the appropriate configuration to remove from the FortiManager when the
+        "state" parameter is set to "param_absent" and to collect the dictionary data that will be returned by the
+        Ansible Module.
+
+        :param module: The AnsibleModule instance.
+        :param proposed: The proposed config to send to the FortiManager.
+        :param existing: The existing configuration for the item on the FortiManager (using the "name" key to get item).
+        :return: A dictionary containing the module exit values.
+        """
+        changed = False
+        config = {}
+
+        if existing:
+            # determine what diff method to call
+            if "dynamic_mapping" not in proposed:
+                diff = self.get_diff_remove(proposed, existing)
+            else:
+                diff = self.get_diff_remove_map(proposed, existing)
+
+            if diff:
+                config = self.config_update(module, diff)
+                changed = True
+
+        return {"changed": changed, "config": config, "existing": existing}
+
+    def config_present(self, module, proposed, existing):
+        """
+        This function is used to determine the appropriate configuration to send to the FortiManager API when the
+        "state" parameter is set to "present" and to collect the dictionary data that will be returned by the Ansible
+        Module.
+
+        :param module: The AnsibleModule instance.
+        :param proposed: The proposed config to send to the FortiManager.
+        :param existing: The existing configuration for the item on the FortiManager (using the "name" key to get item).
+        :return: A dictionary containing the module exit values.
+        """
+        changed = False
+        config = {}
+
+        if not existing:
+            config = self.config_new(module, proposed)
+            changed = True
+        else:
+            # determine what diff method to call
+            if "dynamic_mapping" not in proposed:
+                diff = self.get_diff_add(proposed, existing)
+            else:
+                diff = self.get_diff_add_map(proposed, existing)
+
+            if diff:
+                config = self.config_update(module, diff)
+                changed = True
+
+        return {"changed": changed, "config": config, "existing": existing}
+
+    def config_response(self, module, json_response, lock):
+        """
+        This method is to handle the logic for Ansible modules for handling the config request's response. If the lock
+        parameter is set to true and the config was successful, the config_commit method is used to save the
+        configuration and unlock the ADOM session. If the lock parameter is set to true and the config was
+        unsuccessful, the config_unlock method is used to attempt to unlock the ADOM session before failing. If the lock
+        parameter is set to False and the configuration is unsuccessful, the module will fail with the json response.
+
+        :param module: The Ansible Module instance started by the task.
+        :param json_response: Type dict.
+                              The json response from the requests module's configuration request.
+        :param lock: Type bool.
+                     The setting of the configuration lock. True means locking mechanism is in place.
+        :return: True if configuration was saved and the adom unlocked.
+        """
+        # save and unlock in a single request if config successful and session locked
+        if json_response["result"][0]["status"]["code"] == 0 and lock:
+            self.config_commit(module)
+        # attempt to unlock if config unsuccessful
+        elif json_response["result"][0]["status"]["code"] != 0 and lock:
+            self.config_unlock(module, msg=json_response, saved=False)
+            module.fail_json(msg=json_response, locked=True, saved=False, unlocked=True)
+        # fail if not using lock mode and config unsuccessful
+        elif json_response["result"][0]["status"]["code"] != 0:
+            module.fail_json(msg=json_response)
+
+    def config_save(self, module, msg="Unable to Save Config, Successfully Unlocked"):
+        """
+        This method is used to handle the logic for Ansible modules for saving a config when "lock" is set to True. The
+        save method is used to make the request to the FortiManager. If the save is unsuccessful, the module will use
+        the config_unlock method to attempt to unlock before failing.
+
+        :param module: The Ansible Module instance started by the task.
+        :param msg: Type str.
+                    A message for the module to return upon failure.
+        :return: True if the configuration was saved successfully.
+        """
+        save_status = self.save()
+        if save_status["result"][0]["status"]["code"] != 0:
+            self.config_unlock(module, "Config Updated, but Unable to Save or Unlock", False)
+            # try to logout before failing
+            self.logout()
+            module.fail_json(msg=msg, locked=True, saved=False, unlocked=True)
+
+        return True
+
+    def config_unlock(self, module, msg="Config Saved, but Unable to Unlock", saved=True):
+        """
+        This method is used to handle the logic for Ansible modules for locking the ADOM when "lock" is set to True. The
+        config_lock is used to lock the configuration if the lock param is set to True. The unlock method is used to
+        make the request to the FortiManager.
+
+        :param module: The Ansible Module instance started by the task.
+        :param msg: Type str.
+                    A message for the module to return upon failure.
+        :param saved: Type bool.
+                      The save status of the configuration.
+        :return: True if unlock successful.
+        """
+        unlock_status = self.unlock()
+        if unlock_status["result"][0]["status"]["code"] != 0:
+            # try to logout before failing
+            self.logout()
+            module.fail_json(msg=msg, locked=True, saved=saved, unlocked=False)
+
+        return True
+
+    def config_update(self, module, update_config):
+        """
+        This method is used to handle the logic for Ansible modules when the "state" is set to "present" and their is
+        not currently an object of the same type with the same name. The config_response method is used to handle the
+        logic from the response to update the object.
+
+        :param module: The Ansible Module instance started by the task.
+        :param update_config: Type dict.
+                              The config dictionary with the objects configuration to send to the FortiManager API. Only
+                              the keys that have updates need to be included. This corresponds to the "data" portion of
+                              the request body.
+        :return: A dictionary that corresponds to the configuration that was sent in the request body to the
+                 FortiManager API. This dict will map to the "config" key returned by the Ansible Module.
+        """
+        # lock config if set and module not in check mode
+        if module.params["lock"] and not module.check_mode:
+            self.config_lock(module)
+
+        # configure if not in check mode
+        if not module.check_mode:
+            response = self.update_config(update_config)
+            self.config_response(module, response.json(), module.params["lock"])
+
+        return {"method": "update", "params": [{"url": self.obj_url, "data": update_config}]}
+
+    def create_revision(self, proposed):
+        """
+        This method is used to create an ADOM revision on the FortiManager. The make_request method is used to make the
+        API request to add the revision.
+
+        :param proposed: Type list.
+                         The data portion of the API Request.
+        :return: The json response data from the request to make a revision.
+        """
+        rev_url = "{}revision".format(self.dvmdb_url)
+        body = {"method": "add", "params": [{"url": rev_url, "data": proposed}], "session": self.session}
+        response = self.make_request(body).json()
+
+        return response
+
+    def delete_config(self, name):
+        """
+        This method is used to submit a configuration request to delete an object from the FortiManager.
+
+        :param name: Type str.
+                     The name of the object to be removed from the FortiManager.
+        :return: The response from the API request to delete the configuration.
+        """
+        item_url = self.obj_url + "/{}".format(name)
+        body = {"method": "delete", "params": [{"url": item_url}], "session": self.session}
+        response = self.make_request(body)
+
+        return response
+
+    def delete_revision(self, version):
+        """
+        This method is used to delete an ADOM revision from the FortiManager. The make_request method is used to submit
+        the request to the FortiManager.
+
+        :param version: Type str.
+                        The version number corresponding to the revision to delete.
+        :return: The json response data from the request to delete the revision.
+        """
+        rev_url = "{}revision/{}".format(self.dvmdb_url, version)
+        body = {"method": "delete", "params": [{"url": rev_url}], "session": self.session}
+        response = self.make_request(body).json()
+
+        return response
+
+    def delete_revisions(self, versions):
+        """
+        This method is used to delete several ADOM revisions from the FortiManager using batched requests, so the
+        result of each deletion is returned without retrieving the revisions again.
+
+        :param versions: Type list.
+                         The version numbers corresponding to the revisions to delete.
+        :return: A list of result dictionaries; the result at each index belongs to the version at the same index.
+        """
+        params = [{"url": "{}revision/{}".format(self.dvmdb_url, version)} for version in versions]
+
+        return self.make_batch_request("delete", params)
+
+    def get_adom_fields(self, adom, fields=[]):
+        """
+        This method is used to get all adoms currently configured on the FortiManager. A list of fields can be passed
+        in to limit the scope of what data is returned for the ADOM.
+
+        :param adom: Type str.
+                     The name of the ADOM to retrieve the configuration for.
+        :param fields: Type list.
+                       A list of fields to retrieve for the ADOM.
+        :return: The json response from the request to retrieve the configured ADOM. An empty list is returned if the
+                 request does not return any data.
+        """
+        body = dict(method="get", params=[dict(url="/dvmdb/adom", filter=["name", "==", adom], fields=fields)],
+                    verbose=1, session=self.session)
+        response = self.make_request(body)
+
+        return response.json()["result"][0].get("data", [])
+
+    def get_adoms_fields(self, fields=[]):
+        """
+        This method is used to get all adoms currently configured on the FortiManager. A list of fields can be passed
+        in to limit the scope of what data is returned per ADOM.
+
+        :param fields: Type list.
+                       A list of fields to retrieve for each ADOM.
+        :return: The json response from the request to retrieve the configured ADOMs. An empty list is returned if the
+                 request does not return any data.
+        """
+        body = dict(method="get", params=[dict(url="/dvmdb/adom", fields=fields)], verbose=1, session=self.session)
+        response = self.make_request(body)
+
+        return response.json()["result"][0].get("data", [])
+
+    def get_all(self):
+        """
+        This method is used to get all objects currently configured on the FortiManager for the ADOM and API Endpoint.
+
+        :return: The list of configuration dictionaries for each object. An empty list is returned if the request does
+                 not return any data.
+        """
+        body = {"method": "get", "params": [{"url": self.obj_url}], "verbose": 1, "session": self.session}
+        response = self.make_request(body)
+
+        return response.json()["result"][0].get("data", [])
+
+    def get_all_fields(self, fields):
+        """
+        This method is used to get all objects currently configured on the FortiManager for the ADOM and API Endpoint.
+        The configuration fields retrieved are limited to the list defined in the fields variable.
+
+        :param fields: Type list.
+                       The list of fields to return for each object.
+        :return: The list of configuration dictionaries for each object. An empty list is returned if the request does
+                 not return any data.
+        """
+        params = [{"url": self.obj_url, "fields": fields}]
+        body = {"method": "get", "params": params, "verbose": 1, "session": self.session}
+        response = self.make_request(body)
+
+        return response.json()["result"][0].get("data", [])
+
+    def get_all_paged(self, fields=[], page_size=1000):
+        """
+        This method is used to lazily iterate over all objects currently configured on the FortiManager for the ADOM and
+        API Endpoint, retrieving them one page at a time so that large tables are never held in a single response.
+
+        :param fields: Type list.
+                       The list of fields to return for each object; all fields are returned when empty.
+        :param page_size: Type int.
+                          The number of objects to retrieve per request.
+        :return: A generator yielding the configuration dictionary of each object.
+        """
+        return self.get_paged(self.obj_url, fields, page_size)
+
+    def get_cached_hash(self, name):
+        """
+        This method is used to get the hash of the configuration last applied to an object from the hash_cache file.
+
+        :param name: Type str.
+                     The name of the object.
+        :return: The hash as a str. None is returned if hash_cache is not set or the object has no cached hash.
+        """
+        if not self.hash_cache:
+            return None
+
+        return self.read_hash_cache().get("{}:{}{}/{}".format(self.host, self.port, self.obj_url, name))
+
+    def get_config_hash(self, config):
+        """
+        This method is used to get a hash of an object's configuration. The configuration is normalized first, so the
+        hash does not depend on key order, the order of lists that are appended to, or whether numbers are passed as
+        strings.
+
+        :param config: Type dict.
+                       The configuration to hash.
+        :return: The SHA-256 hex digest of the normalized configuration as a str.
+        """
+        normalized = json.dumps(self.normalize_config(config, self.replace_fields), sort_keys=True)
+
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def get_device_config(self, device, vdom, config_url, fields=[]):
+        """
+        This method is used to retrieve the static routes configured on the managed device.
+
+        :param device: Type str.
+                       The device to retrieve the static route configuration from.
+        :param vdom: Type str.
+                     The vdom to retrieve the static route configuration from.
+        :param config_url: Type str.
+                           The url associated with the configuration section to retrieve.
+        :param fields: Type list.
+                       A list of fields to retrieve for the device.
+        :return: The json response from the request to retrieve the static routes. An empty list is returned if the
+                 request does not return any data.
+        """
+        config_url = "/pm/config/device/{}/vdom/{}/{}".format(device, vdom, config_url)
+        body = dict(method="get", params=[dict(url=config_url, fields=fields)], verbose=1, session=self.session)
+        response = self.make_request(body).json()["result"][0].get("data", [])
+
+        if not response:
+            response = []
+
+        return response
+
+    def get_device_config_paged(self, device, vdom, config_url, fields=[], page_size=1000):
+        """
+        This method is used to lazily retrieve a configuration section from a managed device one page at a time.
+
+        :param device: Type str.
+                       The device to retrieve the configuration from.
+        :param vdom: Type str.
+                     The vdom to retrieve the configuration from.
+        :param config_url: Type str.
+                           The url associated with the configuration section to retrieve.
+        :param fields: Type list.
+                       A list of fields to retrieve for each entry.
+        :param page_size: Type int.
+                          The number of entries to retrieve per request.
+        :return: A generator yielding each configuration entry of the section.
+        """
+        config_url = "/pm/config/device/{}/vdom/{}/{}".format(device, vdom, config_url)
+
+        return self.get_paged(config_url, fields, page_size)
+
+    def get_device_configs(self, sections, fields=[]):
+        """
+        This method is used to retrieve several configuration sections from managed devices using batched requests.
+
+        :param sections: Type list.
+                         A list of (device, vdom, config_url) tuples identifying each section to retrieve.
+        :param fields: Type list.
+                       A list of fields to retrieve for each section.
+        :return: A list with the configuration data of each section, in the same order as sections. An empty list is
+                 used for any section that does not return any data.
+        """
+        params = []
+        for device, vdom, config_url in sections:
+            config_url = "/pm/config/device/{}/vdom/{}/{}".format(device, vdom, config_url)
+            params.append(dict(url=config_url, fields=fields))
+
+        results = self.make_batch_request("get", params)
+
+        return [result.get("data") or [] for result in results]
+
+    def get_device_fields(self, device, fields=[]):
+        """
+        This method is used to retrieve information about a managed device from FortiManager. A list of fields can be
+        passed int o limit the scope of what data is returned for the device.
+
+        :param device: Type str.
+                       The name of the device to retrieve information for.
+        :param fields: Type list.
+                       A list of fields to retrieve for the device.
+        :return: The json response from the request to retrieve the configured device. An empty list is returned if the
+                 request does not return any data.
+        """
+        body = dict(method="get", params=[dict(url="/dvmdb/device", filter=["name", "==", device], fields=fields)],
+                    verbose=1, session=self.session)
+        response = self.make_request(body)
+
+        return response.json()["result"][0].get("data", [])
+
+    def get_device_ha(self, device):
+        """
+        This method is used to get HA information for a device managed by FortiManager.
+
+        :param device: The device to retrieve the HA status from.
+        :return: The json response from the request to retrieve the HA status. An empty list is returned if the request
+                 does not return any data.
+        """
+        if not self.adom:
+            dev_url = "/dvmdb/device/{}/ha_slave".format(self.adom, device)
+        else:
+            dev_url = "{}device/{}/ha_slave".format(self.dvmdb_url, device)
+        body = dict(method="get", params=[dict(url=dev_url)], verbose=1, session=self.session)
+        response = self.make_request(body)
+
+        return response.json()["result"][0].get("data", [])
+
+    def get_device_vdoms(self, device):
+        """
+        This method is used to retrieve the VDOMs associated with a device managed by FortiManager.
+
+        :param device: The device to retrieve the HA status from.
+        :return: The json response from the request to retrieve the HA status. An empty list is returned if the request
+                 does not return any data.
+        """
+        if not self.adom:
+            dev_url = "/dvmdb/device/{}/vdom".format(device)
+        else:
+            dev_url = "{}device/{}/vdom".format(self.dvmdb_url, device)
+        body = dict(method="get", params=[dict(url=dev_url)], verbose=1, session=self.session)
+        response = self.make_request(body)
+
+        return response.json()["result"][0].get("data", [])
+
+    def get_devices_fields(self, fields=[], dev_filter=[]):
+        """
+        This method is used to retrieve information about a managed devices from FortiManager. A list of fields can be
+        passed int o limit the scope of what data is returned for each the device.
+
+        :param fields: Type list.
+                       A list of fields to retrieve for the device.
+        :param dev_filter: Type list.
+                       A list matching to a filter parameter for API requests [<key>, <operator>, <value>].
+        :return: The json response from the request to retrieve the configured devices. An empty list is returned if the
+                 request does not return any data.
+        """
+        if not self.adom:
+            dev_url = "/dvmdb/device"
+        else:
+            dev_url = "{}device".format(self.dvmdb_url)
+
+        body = dict(method="get", params=[dict(url=dev_url, fields=fields, filter=dev_filter)], verbose=1,
+                    session=self.session)
+        response = self.make_request(body)
+
+        return response.json()["result"][0].get("data", [])
+
+    @staticmethod
+    def get_diff_add(proposed, existing):
+        """
+        This method is used to get the difference between two configurations when the "proposed" configuration is a dict
+        of configuration items that should exist in the configuration for the object in the FortiManager. Either the
+        get_item or get_item_fields methods should be used to obtain the "existing" variable; if either of those methods
+        return an empty dict, then you should use the add_config method to add the new object.
+
+        :param proposed: Type dict.
+                         The configuration that should not exist for the object on the FortiManager.
+        :param existing: Type dict.
+                         The current configuration for the object that potentially needs configuration removed.
+        :return: A dict corresponding to the "data" portion of an "update" request. This can be used to call the
+                 update_config method.
+        """
+        config = {}
+        for field in proposed.keys():
+            if field in existing and proposed[field] != existing[field]:
+                if type(existing[field]) is list:
+                    diff, added = FortiManager.get_member_union(proposed[field], existing[field])
+                    if added:
+                        config[field] = diff
+                elif type(existing[field]) is dict:
+                    config[field] = dict(set(proposed[field].items()).union(existing[field].items()))
+                elif type(existing[field]) is str or type(existing[field]) is unicode:
+                    config[field] = proposed[field]
+            elif field not in existing:
+                config[field] = proposed[field]
+
+        if config:
+            config["name"] = proposed["name"]
+
+        return config
+
+    def get_diff_add_map(self, proposed, existing):
+        """
+        This method is used to get the difference between two dynamic_mapping configurations when the "proposed"
+        configuration is a dict of configuration items that should exist in the configuration for the object in the
+        FortiManager. Either the get_item or get_item_fields method should be used to obtain the "existing" variable; if
+        either of those methods return an empty dict, then you should use the add_config method to add the new object.
+        The existing mappings are indexed by scope, so any number of proposed mappings and scopes are compared in a
+        single pass; the get_diff_add_mapping method is used to compare the fields of each mapping.
+
+        :param proposed: Type dict.
+                         The configuration that should exist for the object on the FortiManager.
+        :param existing: Type dict.
+                         The current configuration for the object that potentially needs its configuration modified.
+        :return: A dict corresponding to the "data" portion of an "update" request. This can be used to call the
+                 update_config method.
+        """
+        existing_map = existing.get("dynamic_mapping", [])
+        scopes = self.get_scope_index(existing_map)
+        updates = {}
+        new_maps = []
+
+        for proposed_map in proposed.get("dynamic_mapping", []):
+            fields = dict((k, v) for k, v in proposed_map.items() if k != "_scope")
+            new_scopes = []
+            for scope in proposed_map["_scope"]:
+                position = scopes.get((scope.get("name"), scope.get("vdom")))
+                if position is None:
+                    new_scopes.append(scope)
+                    continue
+
+                # compare against the mapping with any updates already found for one of its other scopes
+                mapping = dict(existing_map[position], **updates.get(position, {}))
+                updated_map = self.get_diff_add_mapping(fields, mapping)
+                if updated_map:
+                    updates.setdefault(position, {}).update(updated_map)
+
+            if new_scopes:
+                new_maps.append(dict(fields, _scope=new_scopes))
+
+        if not updates and not new_maps:
+            return {}
+
+        # keep unrelated mappings in diff so that diff can be used to update FortiManager
+        mappings = [dict(updates.get(position, {}), _scope=mapping["_scope"])
+                    for position, mapping in enumerate(existing_map)]
+        if new_maps:
+            config = dict(proposed, dynamic_mapping=new_maps + mappings)
+        else:
+            config = dict(name=proposed.get("name"), dynamic_mapping=mappings)
+
+        return config
+
+    @staticmethod
+    def get_diff_add_mapping(proposed_map, mapping):
+        """
+        This method is used to get the difference between the fields of a proposed dynamic_mapping and an existing
+        mapping for the same scope. Endpoints that replace lists instead of appending to them override this method.
+
+        :param proposed_map: Type dict.
+                             The mapping fields, without the "_scope" key, that should exist for the scope.
+        :param mapping: Type dict.
+                        The existing mapping for the scope.
+        :return: A dict of the mapping fields that need to be updated. An empty dict is returned if there is no change.
+        """
+        updated_map = {}
+        for field in proposed_map.keys():
+            # only consider relevant fields that have a difference
+            if field in mapping and proposed_map[field] != mapping[field]:
+                if type(mapping[field]) is list:
+                    diff, added = FortiManager.get_member_union(proposed_map[field], mapping[field])
+                    if added:
+                        updated_map[field] = diff
+                elif type(mapping[field]) is dict:
+                    updated_map[field] = dict(set(proposed_map[field].items()).union(mapping[field].items()))
+                elif type(mapping[field]) is str or type(mapping[field]) is unicode:
+                    updated_map[field] = proposed_map[field]
+            elif field not in mapping:
+                updated_map[field] = proposed_map[field]
+
+        return updated_map
+
+    def get_diff_mappings(self, proposed, existing):
+        """
+        This method is to get the diff of just the mapped Fortigate devices. Mappings are removed when every one of
+        their scopes is in the proposed mappings.
+        :param proposed: Type dict.
+                         The configuration that should not exist for the object on the FortiManager.
+        :param existing: Type dict.
+                         The current configuration for the object that potentially needs configuration removed.
+        :return: A dict corresponding to the "data" portion of an "update" request. This can be used to call the
+                 update_config method.
+        """
+        proposed_scopes = self.get_scope_index(proposed["dynamic_mapping"])
+        config = dict(name=proposed["name"], dynamic_mapping=[])
+        for mapping in existing.get("dynamic_mapping", []):
+            if not all((scope.get("name"), scope.get("vdom")) in proposed_scopes for scope in mapping["_scope"]):
+                config["dynamic_mapping"].append(dict(_scope=mapping["_scope"]))
+
+        if len(config["dynamic_mapping"]) == len(existing.get("dynamic_mapping", [])):
+            config = {}
+
+        return config
+
+    @staticmethod
+    def get_diff_remove(proposed, existing):
+        """
+        This method is used to get the difference between two configurations when the "proposed" configuration is a dict
+        of configuration items that should not exist in the configuration for the object in the FortiManager. Either the
+        get_item or get_item_fields methods should be used to obtain the "existing" variable; if either of those methods
+        return an empty dict, then the object does not exist and there is no configuration to remove.
+
+        :param proposed: Type dict.
+                         The configuration that should not exist for the object on the FortiManager.
+        :param existing: Type dict.
+                         The current configuration for the object that potentially needs configuration removed.
+        :return: A dict corresponding to the "data" portion of an "update" request. This can be used to call the
+                 update_config method.
+        """
+        config = {}
+        for field in proposed.keys():
+            if field in existing and type(existing[field]) is list:
+                diff, removed = FortiManager.get_member_difference(existing[field], proposed[field])
+                if removed:
+                    config[field] = diff
+            elif field in existing and type(existing[field]) is dict:
+                diff = dict(set(proposed.items()).difference(existing.items()))
+                if diff != existing[field]:
+                    config[field] = diff
+
+        if config:
+            config["name"] = proposed["name"]
+
+        return config
+
+    def get_diff_remove_map(self, proposed, existing):
+        """
+        This method is used to get the difference between two dynamic_mapping configurations when the "proposed"
+        configuration is a dict of configuration items that should not exist in the configuration for the object in the
+        FortiManager. Either the get_item or get_item_fields method should be used to obtain the "existing" variable; if
+        either of those methods return an empty dict, then the object does not exist and there is no configuration to
+        remove. The existing mappings are indexed by scope, so any number of proposed mappings and scopes are compared
+        in a single pass; the get_diff_remove_mapping method is used to compare the fields of each mapping.
+
+        :param proposed: Type dict.
+                         The configuration that should not exist for the object on the FortiManager.
+        :param existing: Type dict.
+                         The current configuration for the object that potentially needs configuration removed.
+        :return: A dict corresponding to the "data" portion of an "update" request. This can be used to call the
+                 update_config method.
+        """
+        existing_map = existing.get("dynamic_mapping", [])
+        scopes = self.get_scope_index(existing_map)
+        updates = {}
+
+        for proposed_map in proposed.get("dynamic_mapping", []):
+            fields = dict((k, v) for k, v in proposed_map.items() if k != "_scope")
+            for scope in proposed_map["_scope"]:
+                # scopes that are not mapped have no configuration to remove
+                position = scopes.get((scope.get("name"), scope.get("vdom")))
+                if position is None:
+                    continue
+
+                mapping = dict(existing_map[position], **updates.get(position, {}))
+                updated_map = self.get_diff_remove_mapping(fields, mapping)
+                if updated_map:
+                    updates.setdefault(position, {}).update(updated_map)
+
+        if not updates:
+            return {}
+
+        # keep unrelated mappings in diff so that diff can be used to update FortiManager
+        mappings = [dict(updates.get(position, {}), _scope=mapping["_scope"])
+                    for position, mapping in enumerate(existing_map)]
+
+        return dict(name=proposed.get("name"), dynamic_mapping=mappings)
+
+    @staticmethod
+    def get_diff_remove_mapping(proposed_map, mapping):
+        """
+        This method is used to get the difference between the fields of a proposed dynamic_mapping and an existing
+        mapping for the same scope when the proposed fields should not exist. Endpoints with fields that can not be
+        removed override this method.
+
+        :param proposed_map: Type dict.
+                             The mapping fields, without the "_scope" key, that should not exist for the scope.
+        :param mapping: Type dict.
+                        The existing mapping for the scope.
+        :return: A dict of the mapping fields that need to be updated. An empty dict is returned if there is no change.
+        """
+        updated_map = {}
+        for field in proposed_map.keys():
+            if field in mapping and type(mapping[field]) is list:
+                diff, removed = FortiManager.get_member_difference(mapping[field], proposed_map[field])
+                if removed:
+                    updated_map[field] = diff
+            elif field in mapping and type(mapping[field]) is dict:
+                diff = dict(set(proposed_map.items()).difference(mapping.items()))
+                if diff != mapping[field]:
+                    updated_map[field] = diff
+
+        return updated_map
+
+    def get_ha(self):
+        """
+        This method is used to retrieve the HA status of the FortiManager.
+
+        :return: The json response data from the request to retrieve the HA status.
+        """
+        body = dict(method="get", params=[dict(url="/cli/global/system/ha")], verbose=1, session=self.session)
+        response = self.make_request(body).json()["result"][0].get("data", [])
+
+        return response
+
+    def get_install_status(self, name):
+        """
+        This method is used to get the config and connection status of the specified FortiGate.
+
+        :param name: Type str.
+                     The name of the FortiGate from which to retrieve the current status.
+        :return: The json response data from the request to retrieve device status.
+        """
+        params = [{"url": "{}device".format(self.dvmdb_url), "filter": ["name", "==", name],
+                   "fields": ["name", "conf_status", "conn_status"]}]
+        body = {"method": "get", "params": params, "verbose": 1, "session": self.session}
+        response = self.make_request(body).json()
+
+        return response
+
+    def get_item(self, name):
+        """
+        This method is used to get a specific object currently configured on the FortiManager for the ADOM and API
+        Endpoint.
+
+        :param name: Type str.
+                     The name of the object to retrieve.
+        :return: The configuration dictionary for the object. An empty dict is returned if the request does
+                 not return any data.
+        """
+        item_url = self.obj_url + "/{}".format(name)
+        body = {"method": "get", "params": [{"url": item_url}], "verbose": 1, "session": self.session}
+        response = self.make_request(body)
+
+        return response.json()["result"][0].get("data", {})
+
+    def get_item_fields(self, name, fields):
+        """
+        This method is used to get a specific object currently configured on the FortiManager for the ADOM and API
+        Endpoint. The configuration fields retrieved are limited to the list defined in the fields variable.
+
+        :param name: Type str.
+                     The name of the object to retrieve.
+        :param fields: Type list.
+                       The list of fields to return for each object.
+        :return: The list of configuration dictionaries for each object. An empty list is returned if the request does
+                 not return any data.
+        """
+        params = [{"url": self.obj_url, "filter": ["name", "==", name], "fields": fields}]
+        body = {"method": "get", "params": params, "verbose": 1, "session": self.session}
+        response = self.make_request(body)
+        response_data = response.json()["result"][0].get("data", [{}])
+
+        if response_data:
+            return response_data[0]
+        else:
+            return {}
+
+    def get_items(self, names):
+        """
+        This method is used to get several objects currently configured on the FortiManager for the ADOM and API
+        Endpoint using batched requests.
+
+        :param names: Type list.
+                      The names of the objects to retrieve.
+        :return: A dictionary mapping each name to its configuration dictionary. An empty dict is used for any object
+                 that does not exist.
+        """
+        params = [{"url": self.obj_url + "/{}".format(name)} for name in names]
+        results = self.make_batch_request("get", params)
+
+        return dict((name, result.get("data", {})) for name, result in zip(names, results))
+
+    def get_lock_info(self):
+        """
+        This method is used to get the lock info of the ADOM's workspace, which includes the user and session holding
+        the lock.
+
+        :return: The lock info returned by the FortiManager. An empty list is returned if the request does not return
+                 any data.
+        """
+        body = {"method": "get", "params": [{"url": self.wsp_url + "lockinfo"}], "verbose": 1, "session": self.session}
+        response = self.make_request(body)
+
+        return response.json()["result"][0].get("data", [])
+
+    @staticmethod
+    def get_member_difference(existing, proposed):
+        """
+        This method is used to remove members from a list while preserving the order of the remaining members, so the
+        result only differs from the existing list when a member is actually removed.
+
+        :param existing: Type list.
+                         The members currently configured.
+        :param proposed: Type list.
+                         The members that should not exist.
+        :return: A tuple of the remaining members and the members that were removed, each in their existing order.
+        """
+        proposed = set(proposed)
+        members = []
+        removed = []
+        for member in existing:
+            if member in proposed:
+                removed.append(member)
+            else:
+                members.append(member)
+
+        return members, removed
+
+    @staticmethod
+    def get_member_union(proposed, existing):
+        """
+        This method is used to add members to a list while preserving the order of the existing members, so the result
+        only differs from the existing list when a member is actually added. New members are appended in the order they
+        are proposed.
+
+        :param proposed: Type list.
+                         The members that should exist.
+        :param existing: Type list.
+                         The members currently configured.
+        :return: A tuple of the combined members and the members that were added.
+        """
+        members = list(existing)
+        seen = set(existing)
+        added = []
+        for member in proposed:
+            if member not in seen:
+                seen.add(member)
+                added.append(member)
+
+        members.extend(added)
+
+        return members, added
+
+    def get_paged(self, url, fields=[], page_size=1000):
+        """
+        This method is used to lazily retrieve the entries of a table using the API's "range" parameter. A new request
+        is only made once the entries of the previous page have been consumed.
+
+        :param url: Type str.
+                    The url of the table to retrieve.
+        :param fields: Type list.
+                       The list of fields to return for each entry; all fields are returned when empty.
+        :param page_size: Type int.
+                          The number of entries to retrieve per request.
+        :return: A generator yielding each entry of the table.
+        """
+        offset = 0
+        while True:
+            params = [{"url": url, "range": [offset, page_size]}]
+            if fields:
+                params[0]["fields"] = fields
+
+            body = {"method": "get", "params": params, "verbose": 1, "session": self.session}
+            data = self.make_request(body).json()["result"][0].get("data") or []
+            for entry in data:
+                yield entry
+
+            # a short page is the last page; a page larger than requested means the range was not honored
+            if len(data) != page_size:
+                break
+
+            offset += page_size
+
+    def get_revision(self, name=""):
+        """
+        This method is used to retrieve ADOM revisions from the FortiManager. If name is not specified, all revisions
+        will be returned.
+
+        :param name: Type str.
+                     The name of the revision to retrieve.
+        :return: The json response data from the request to retrieve the revision.
+        """
+        params = [{"url": "{}revision".format(self.dvmdb_url)}]
+        if name:
+            # noinspection PyTypeChecker
+            params[0].update({"filter": ["name", "==", name]})
+
+        body = {"method": "get", "params": params, "verbose": 1, "session": self.session}
+        response = self.make_request(body).json()
+
+        return response
+
+    @staticmethod
+    def get_scope_index(mappings):
+        """
+        This method is used to index dynamic_mapping entries by the FortiGate and VDOM of each of their scopes.
+
+        :param mappings: Type list.
+                         The dynamic_mapping entries to index.
+        :return: A dict mapping each (name, vdom) scope tuple to the position of its entry in mappings.
+        """
+        index = {}
+        for position, mapping in enumerate(mappings):
+            for scope in mapping.get("_scope", []):
+                index[(scope.get("name"), scope.get("vdom"))] = position
+
+        return index
+
+    def get_status(self):
+        """
+        This method is used to retrieve the status of the FortiManager.
+
+        :return: The json response data from the request to retrieve system status.
+        """
+        body = dict(method="get", params=[dict(url="/sys/status")], verbose=1, session=self.session)
+        response = self.make_request(body)
+
+        return response.json()["result"][0].get("data", [])
+
+    def get_task(self, task, wait):
+        """
+        This method is used to get the status of a task. The wait_task method is used to poll the task.
+
+        :param task: Type str.
+                     The task id to retrieve
+        :param wait: Type int.
+                     The number of minutes to wait before failing.
+        :return: The json results from the task once completed, failed, or time ran out.
+        """
+        response, waited = self.wait_task(task, wait * 60)
+
+        return response
+
+    def install_package(self, proposed):
+        """
+        This method is used to install a package to the end devices. The start_install method is used to issue the
+        install, and the method waits for the install task to complete.
+
+        :param proposed: Type list.
+                         The data portion of the API Request.
+        :return: The json result data from the task associated with request to make install the package.
+        """
+        response = self.start_install(proposed)
+
+        # collect task id
+        if response["result"][0]["status"]["code"] == 0:
+            task = response["result"][0]["data"]["task"]
+        else:
+            return response
+
+        # check for task completion
+        task_status, waited = self.wait_task(task, 600)
+        task_status["waited"] = waited
+
+        return task_status
+
+    def join_lease(self, module):
+        """
+        This method is used to run a module within the workspace transaction started by fortimgr_lock with lease_file.
+        The transaction's session is used if session_id is not given, and the lock param is set to False, as the ADOM is
+        already locked by the transaction and is saved and unlocked by fortimgr_lock. The module fails if the
+        transaction was abandoned, as the ADOM was unlocked without saving the transaction's earlier writes.
+
+        :param module: The Ansible Module instance started by the task.
+        :return: The session_id param, or the transaction's session if session_id is not given. None is returned if
+                 neither is available, and the module should login.
+        """
+        session_id = module.params["session_id"]
+        lease = self.read_lease() if self.lease_file else {}
+        if lease.get("error"):
+            module.fail_json(msg=lease["error"], locked=False, saved=False, unlocked=False)
+        elif lease:
+            module.params["lock"] = False
+            session_id = session_id or lease.get("session")
+
+        return session_id
+
+    def lock(self):
+        """
+        The lock method is used to lock the ADOM to enable configurations to be sent to the FortiManager when it has
+        workspace mode enabled.
+
+        :return: The JSON response from the request to lock the session.
+        """
+        body = {"method": "exec", "params": [{"url": self.wsp_url + "lock"}], "session": self.session}
+        response = self.make_request(body)
+
+        return response.json()
+
+    def login(self, private=False):
+        """
+        The login method is used to establish a session with the FortiManager. All necessary parameters need to be
+        established at class instantiation. If session_cache is set, the login_cached method is used instead.
+
+        :param private: Type bool.
+                        Logs in with a new session that is not shared through session_cache or the broker.
+        :return: The response from the login request. The instance session is also set, and defaults to None if the
+        login was not successful
+        """
+        if self.session_cache and not private:
+            return self.login_cached()
+
+        params = [{"url": "/sys/login/user", "data": {"user": self.user, "passwd": self.passw}}]
+        body = {"method": "exec", "params": params}
+        if private:
+            # the broker returns the session it shares between clients, so a private session is logged in directly
+            login = self.http_session.post(self.url, json=body, timeout=self.timeout)
+            self.shared_session = False
+        else:
+            login = self.make_request(body)
+            self.shared_session = self.brokered
+
+        self.session = login.json().get("session")
+
+        return login
+
+    def login_cached(self):
+        """
+        The login_cached method is used to reuse a session stored in the session_cache file by a previous module run.
+        The cached session is validated with an inexpensive status request, and a new login is only made if there is no
+        cached session, the session is no longer valid, or the session is older than session_cache_ttl; sessions older
+        than session_cache_ttl are logged out. The cache file is locked while in use so that concurrent module runs
+        share a single session.
+
+        :return: The response from the status request if the cached session is valid, otherwise the response from the
+                 login request. The instance session is also set, and defaults to None if the login was not successful.
+        """
+        with open(self.session_cache + ".lock", "a") as cache_lock:
+            fcntl.flock(cache_lock, fcntl.LOCK_EX)
+            try:
+                sessions = self.read_session_cache()
+                cached = sessions.get(self.session_cache_key)
+                if cached:
+                    self.session = cached["session"]
+                    if time.time() - cached["created"] < self.session_cache_ttl:
+                        body = dict(method="get", params=[dict(url="/sys/status")], session=self.session)
+                        status = self.make_request(body)
+                        if status.json()["result"][0]["status"]["code"] == 0:
+                            self.shared_session = True
+                            return status
+                    else:
+                        # retire sessions that have outlived the ttl
+                        self.make_request(dict(method="exec", params=[{"url": "/sys/logout"}], session=self.session))
+
+                params = [{"url": "/sys/login/user", "data": {"user": self.user, "passwd": self.passw}}]
+                body = {"method": "exec", "params": params}
+                login = self.make_request(body)
+                self.session = login.json().get("session")
+
+                if self.session:
+                    sessions[self.session_cache_key] = dict(session=self.session, created=time.time())
+                    self.shared_session = True
+                else:
+                    sessions.pop(self.session_cache_key, None)
+                self.write_session_cache(sessions)
+            finally:
+                fcntl.flock(cache_lock, fcntl.LOCK_UN)
+
+        return login
+
+    def logout(self):
+        """
+        The login method is used to establish a session with the FortiManager. All necessary parameters need to be
+        established at class instantiation. Sessions shared through session_cache are left active for later module runs;
+        the logout_cached method is used to end them.
+
+        :return: The response from the login request. The instance session is also set, and defaults to None if the
+        login was not successful
+        """
+        if self.shared_session:
+            self.http_session.close()
+            return None
+
+        body = dict(method="exec", params=[{"url": "/sys/logout"}], session=self.session)
+        logout = self.make_request(body)
+        self.http_session.close()
+
+        return logout
+
+    def logout_cached(self):
+        """
+        The logout_cached method is used to end the session stored in the session_cache file for the host and user, such
+        as at the end of a play. The session is removed from the cache before it is logged out, so later module runs
+        login again instead of reusing it.
+
+        :return: The response from the logout request, or None if no session is cached.
+        """
+        with open(self.session_cache + ".lock", "a") as cache_lock:
+            fcntl.flock(cache_lock, fcntl.LOCK_EX)
+            try:
+                sessions = self.read_session_cache()
+                cached = sessions.pop(self.session_cache_key, None)
+                if cached:
+                    self.write_session_cache(sessions)
+            finally:
+                fcntl.flock(cache_lock, fcntl.LOCK_UN)
+
+        logout = None
+        if cached:
+            body = dict(method="exec", params=[{"url": "/sys/logout"}], session=cached["session"])
+            logout = self.make_request(body)
+        self.http_session.close()
+
+        return logout
+
+    def make_batch_request(self, method, params, batch_size=100):
+        """
+        This method is used to send several API requests that share the same method in a single POST by placing each
+        request in the "params" list of the request body. Requests are split into chunks of batch_size to keep
+        individual responses at a manageable size.
+
+        :param method: Type str.
+                       The API method shared by every request (get, add, set, update, delete, exec).
+        :param params: Type list.
+                       A list of dictionaries, each one being the "params" entry of an individual request.
+        :param batch_size: Type int.
+                           The maximum number of params sent in a single POST.
+        :return: A list of result dictionaries; the result at each index belongs to the params entry at the same index.
+                 If the FortiManager does not return a result for every params entry, such as for an invalid session,
+                 every entry of the chunk is given a failed result so it can not be mistaken for a success.
+        """
+        results = []
+        for index in range(0, len(params), batch_size):
+            chunk = params[index:index + batch_size]
+            body = {"method": method, "params": chunk, "verbose": 1, "session": self.session}
+            response = self.make_request(body).json()
+            chunk_results = response.get("result") or []
+
+            # expand a single top-level error to every entry so callers pairing params and results see each failure
+            if len(chunk_results) != len(chunk):
+                failed = [result["status"] for result in chunk_results if result.get("status", {}).get("code") != 0]
+                status = failed[0] if failed else {"code": -1, "message": "Missing Result for Batched Request"}
+                chunk_results = [{"status": status, "url": param.get("url")} for param in chunk]
+
+            results.extend(chunk_results)
+
+        return results
+
+    def make_broker_request(self, body):
+        """
+        This method is used to forward a request to the FortiManager API through a fortimgr_broker. The request and the
+        broker's reply are each sent as a single line of JSON.
+
+        :param body: Type dict.
+                     The JSON body with the necessary request params.
+        :return: The response from the API request, or None if the broker is not running or closed the connection
+                 without a reply, so the request can be sent directly.
+        """
+        request = dict(url=self.url, verify=self.verify, timeout=self.timeout, body=body)
+        broker = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            broker.connect(self.broker_socket)
+            broker.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            reply = broker.makefile("rb").readline()
+        except socket.error:
+            reply = None
+        finally:
+            broker.close()
+
+        if not reply:
+            return None
+
+        reply = json.loads(reply.decode("utf-8"))
+        if "error" in reply:
+            raise requests.exceptions.ConnectionError(reply["error"])
+
+        response = requests.models.Response()
+        response.status_code = reply["status_code"]
+        response._content = reply["content"].encode("utf-8")
+
+        return response
+
+    def make_request(self, body):
+        """
+        This method is used to make a request to the FortiManager API. All requests to FortiManager use the POST method
+        to the same URL. Requests are sent over the instance's pooled keep-alive connections, so consecutive calls
+        reuse the established TCP and TLS session instead of performing a new handshake. If broker_socket is set, the
+        request is forwarded through the broker instead, and is sent directly if the broker can not be reached.
+
+        :param body: Type dict.
+                     The JSON body with the necessary request params.
+        :return: The response from the API request.
+        """
+        response = None
+        if self.broker_socket:
+            response = self.make_broker_request(body)
+        self.brokered = response is not None
+
+        if response is None:
+            response = self.http_session.post(self.url, json=body, timeout=self.timeout)
+
+        # count the successful writes made within a workspace transaction
+        if self.lease_file and body.get("method") in ["add", "clone", "delete", "move", "set", "update"]:
+            try:
+                results = response.json().get("result") or []
+            except ValueError:
+                results = []
+            writes = len([result for result in results if result.get("status", {}).get("code") == 0])
+            if writes:
+                self.update_lease(writes=writes)
+
+        return response
+
+    @staticmethod
+    def normalize_config(config, replace=[]):
+        """
+        This method is used to convert a configuration to a canonical form used for hashing. Scalars are converted to
+        strings, and lists are sorted unless the field is in replace, as those lists are applied in the order given.
+
+        :param config: Type dict, list, or scalar.
+                       The configuration to normalize.
+        :param replace: Type list.
+                        The list fields whose order is significant.
+        :return: The normalized configuration.
+        """
+        if type(config) is dict:
+            normalized = {}
+            for field, value in config.items():
+                value = FortiManager.normalize_config(value, replace)
+                if type(value) is list and field not in replace:
+                    value = sorted(value, key=lambda entry: json.dumps(entry, sort_keys=True))
+                normalized[field] = value
+            return normalized
+        elif type(config) is list:
+            return [FortiManager.normalize_config(entry, replace) for entry in config]
+        elif type(config) is bool or config is None:
+            return config
+        else:
+            return u"{}".format(config)
+
+    def preview_install(self, package, device, vdoms, lock):
+        """
+        This method is used to preview what changes will be pushed to the end device when the package is installed. The
+        Fortimanager requires the install process be started with the preview flag in order for policy updates to be
+        included in the preview request. This method will handle this process, and cancel the install task after the
+        preview has been generated. This method also makes use of FortiManager's "id" field to keep track of the stages
+        (install preview, generate preview, retrieve preview, cancel install) the method is currently executing, and
+        returns the ID in the response. If the module returns early, then the "id" field can be used to determine where
+        the failure occurred.
+
+        :param package: Type str.
+                        The name of the package in consideration for install.
+        :param device: Type str.
+                       The FortiNet to preview install.
+        :param vdoms: Type list.
+                      The list of vdoms associated with the vdom to preview install
+        :param lock: Type bool
+                     Determines whether the package install preview will use the auto lock field.
+        :return: The json response data from the request to preview install the package.
+        """
+        # issue package install with preview flag to include policy in preview
+        flags = ["preview"]
+        if lock:
+            flags.append("auto_lock_ws")
+
+        proposed = [{"adom": self.adom, "flags": flags, "pkg": package, "scope": [device]}]
+        response = self.install_package(proposed)
+
+        if response["result"][0].get("data", {"state": "error"}).get("state") == "done":
+            # generate preview request
+            proposed = [{"adom": self.adom, "device": device, "vdoms": vdoms}]
+            body = {"method": "exec", "params": [{"url": "/securityconsole/install/preview", "data": proposed}],
+                    "id": 2, "session": self.session}
+            response = self.make_request(body).json()
+        else:
+            response.update({"id": 1})
+            return response
+
+        # collect task id
+        if response["result"][0]["status"]["code"] == 0:
+            task = response["result"][0]["data"]["task"]
+        else:
+            return response
+
+        task_status, waited = self.wait_task(task, 300)
+        if task_status["result"][0]["data"]["percent"] == 100:
+            # cancel install task
+            url = "/securityconsole/package/cancel/install"
+            params = [{"url": url, "data": [{"adom": self.adom, "device": device}]}]
+            body = {"method": "exec", "params": params, "id": 3, "session": self.session}
+            response = self.make_request(body).json()
+        else:
+            task_status.update({"id": 2})
+            return task_status
+
+        if response["result"][0]["status"]["code"] == 0:
+            # get preview result
+            params = [{"url": "/securityconsole/preview/result", "data": [{"adom": self.adom, "device": device}]}]
+            body = {"method": "exec", "params": params, "id": 4,
+                    "session": self.session}
+            response = self.make_request(body).json()
+        else:
+            return response
+
+        return response
+
+    def read_hash_cache(self):
+        """
+        This method is used to read the configuration hashes stored in the hash_cache file.
+
+        :return: A dictionary of hashes keyed by FortiManager and object url. An empty dict is returned if the file does
+                 not exist or cannot be read.
+        """
+        try:
+            with open(self.hash_cache) as cache:
+                return json.load(cache)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def read_lease(self):
+        """
+        This method is used to read the workspace transaction stored in the lease_file.
+
+        :return: A dictionary of the transaction's adom, session, timings, renewals, and writes. An empty dict is
+                 returned if the file does not exist or cannot be read.
+        """
+        try:
+            with open(self.lease_file) as lease:
+                return json.load(lease)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def read_session_cache(self):
+        """
+        This method is used to read the sessions stored in the session_cache file.
+
+        :return: A dictionary of cached sessions keyed by host, port, and user. An empty dict is returned if the file
+                 does not exist or cannot be read.
+        """
+        try:
+            with open(self.session_cache) as cache:
+                return json.load(cache)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def record_hash(self, name, config_hash, committed):
+        """
+        This method is used to record the hash of the configuration applied to an object in the hash_cache file once
+        the configuration is committed, as a change that is later discarded would otherwise be skipped by later tasks.
+        Until then the object's cached hash is removed. Within a workspace transaction started with lease_file, the hash
+        is kept as pending in the lease file, and fortimgr_lock records it when the transaction is saved.
+
+        :param name: Type str.
+                     The name of the object.
+        :param config_hash: Type str.
+                            The hash of the configuration applied to the object. None removes the object's cached hash.
+        :param committed: Type bool.
+                          Whether the configuration is committed, either by saving the change or because nothing was
+                          changed.
+        """
+        if not self.hash_cache:
+            return
+
+        key = "{}:{}{}/{}".format(self.host, self.port, self.obj_url, name)
+        pending = self.lease_file and self.update_lease(hashes={key: config_hash})
+        self.set_cached_hashes({key: config_hash if committed and not pending else None})
+
+    def restore_revision(self, version, proposed):
+        """
+        This method is used to restore an ADOM to a previous revision.
+
+        :param version: Type str.
+                        The version number corresponding to the revision to delete.
+        :param proposed: Type list.
+                         The data portion of the API request.
+        :return: The json response data from the request to delete the revision.
+        """
+        rev_url = "{}revision/{}".format(self.dvmdb_url, version)
+        body = {"method": "clone", "params": [{"url": rev_url, "data": proposed}], "session": self.session}
+        response = self.make_request(body).json()
+
+        return response
+
+    def save(self):
+        """
+        The save method is used to save the ADOM configurations during a locked session.
+
+        :return: The JSON response from the request to save the session.
+        """
+        body = {"method": "exec", "params": [{"url": self.wsp_url + "commit"}], "session": self.session}
+        response = self.make_request(body)
+
+        return response.json()
+
+    def save_unlock(self):
+        """
+        The save_unlock method is used to save the ADOM configurations and unlock the ADOM using a single request. The
+        FortiManager runs the params of the request in order, and runs the unlock even if the save fails. The request is
+        sent using make_batch_request, so a single top-level error, such as for an invalid session, is returned as the
+        result of both steps.
+
+        :return: A dict with the "result" of each step; the first result is from the save and the second from the
+                 unlock.
+        """
+        params = [{"url": self.wsp_url + "commit"}, {"url": self.wsp_url + "unlock"}]
+
+        return {"result": self.make_batch_request("exec", params)}
+
+    def set_cached_hashes(self, updates):
+        """
+        This method is used to store the hashes of the configuration applied to objects in the hash_cache file. The
+        cache file is locked while it is updated so that concurrent module runs do not overwrite each other's hashes.
+
+        :param updates: Type dict.
+                        The hash of each object keyed by its cache key. A hash of None removes the object's cached hash.
+        """
+        with open(self.hash_cache + ".lock", "a") as cache_lock:
+            fcntl.flock(cache_lock, fcntl.LOCK_EX)
+            try:
+                hashes = self.read_hash_cache()
+                for key, config_hash in updates.items():
+                    if config_hash:
+                        hashes[key] = config_hash
+                    else:
+                        hashes.pop(key, None)
+                self.write_hash_cache(hashes)
+            finally:
+                fcntl.flock(cache_lock, fcntl.LOCK_UN)
+
+    def start_install(self, proposed):
+        """
+        This method is used to issue a package install to the end devices without waiting for it to complete. The
+        get_task or wait_task methods can be used to track the task id returned in the response.
+
+        :param proposed: Type list.
+                         The data portion of the API Request.
+        :return: The json response data from the request to install the package.
+        """
+        body = {"method": "exec", "params": [{"url": "/securityconsole/install/package", "data": proposed, "id": 1,
+                                              "session": self.session}]}
+        response = self.make_request(body).json()
+
+        return response
+
+    def unlock(self):
+        """
+        The unlock method is used to lock the ADOM to enable configurations to be sent to the FortiManager when it has
+        workspace mode enabled.
+
+        :return: The JSON response from the request to unlock the session.
+        """
+        body = {"method": "exec", "params": [{"url": self.wsp_url + "unlock"}], "session": self.session}
+        response = self.make_request(body)
+
+        return response.json()
+
+    def update_lease(self, writes=0, renewals=0, hashes=None, **fields):
+        """
+        This method is used to update the workspace transaction stored in the lease_file. The lease file is locked while
+        it is updated so that concurrent module runs and the keepalive process do not overwrite each other's updates.
+        Nothing is written if the lease file does not exist, as the transaction has ended, and the lock file is not
+        created, so no file is left behind once the transaction's files are removed by end_lease.
+
+        :param writes: Type int.
+                       The number of writes to add to the transaction's writes and pending_writes counters.
+        :param renewals: Type int.
+                         The number of renewals to add to the transaction's renewals counter.
+        :param hashes: Type dict.
+                       The configuration hashes to record in the instance's hash_cache when the transaction is saved,
+                       keyed by their cache key.
+        :param fields: Type dict.
+                       Fields of the transaction to set, such as pending_writes=0 after a save.
+        :return: The updated transaction, or an empty dict if the lease file does not exist.
+        """
+        if not os.path.exists(self.lease_file):
+            return {}
+
+        with open(self.lease_file + ".lock", "a") as lease_lock:
+            fcntl.flock(lease_lock, fcntl.LOCK_EX)
+            try:
+                lease = self.read_lease()
+                if lease:
+                    lease["writes"] = lease.get("writes", 0) + writes
+                    lease["pending_writes"] = lease.get("pending_writes", 0) + writes
+                    lease["renewals"] = lease.get("renewals", 0) + renewals
+                    if hashes:
+                        lease.setdefault("pending_hashes", {}).setdefault(self.hash_cache, {}).update(hashes)
+                    lease.update(fields)
+                    self.write_lease(lease)
+            finally:
+                fcntl.flock(lease_lock, fcntl.LOCK_UN)
+
+        return lease
+
+    def update_config(self, update_config):
+        """
+        This method is used to submit a configuration update request to the FortiManager. Only the object configuration
+        details need to be provided; all other parameters that make up the API request body will be handled by the
+        method. Only fields that need to be updated are required to be in the "update_config" variable (EX: updating
+        the comment for an address group only needs the "name" and "comment" fields in the configuration dictionary).
+        When including a field in the configuration update, ensure that all items are included for the desired end-state
+        (EX: adding address to an address group that already has ["svr01", "svr02"] should include all three
+        addresses in the "member" list, ["svr01", "svr02", "svr03"]. If you want to remove part of an item's
+        configuration, this method should be used, and the item to be removed should be left off the respective list
+        (EX: removing an address from an address group that has ["svr01", "svr02", "svr03"] should have a "member" list
+        like ["svr01", "svr02"] with the final state of the address group containing only svr01 and svr02).
+
+        :param update_config: Type list.
+                           The "data" portion of the configuration to be submitted to the FortiManager.
+        :return: The response from the API request to add the configuration.
+        """
+        body = {"method": "update", "params": [{"url": self.obj_url, "data": update_config, "session": self.session}]}
+        response = self.make_request(body)
+
+        return response
+
+    def wait_task(self, task, timeout, callback=None, interval=1, max_interval=15):
+        """
+        This method is used to wait for a task to complete. The task is polled quickly at first and the delay between
+        polls doubles up to max_interval, so short tasks return within seconds while long tasks are not polled
+        excessively. Time is measured with a monotonic clock so the deadline is not affected by wall clock changes.
+
+        :param task: Type str.
+                     The task id to wait for.
+        :param timeout: Type int.
+                        The number of seconds to wait for the task before returning.
+        :param callback: Type function.
+                         A function called with the task data after each successful poll, used to report progress.
+        :param interval: Type int.
+                         The number of seconds to wait after the first poll.
+        :param max_interval: Type int.
+                             The maximum number of seconds to wait between polls.
+        :return: A tuple of the json results from the task once completed, failed, or time ran out, and the number of
+                 seconds spent waiting.
+        """
+        clock = getattr(time, "monotonic", time.time)
+        body = {"method": "get", "params": [{"url": "task/task/{}".format(task)}], "verbose": 1,
+                "session": self.session}
+        start = clock()
+        deadline = start + timeout
+        delay = interval
+
+        while True:
+            response = self.make_request(body).json()
+            if response["result"][0]["status"]["code"] == 0:
+                if callback:
+                    callback(response["result"][0]["data"])
+                if response["result"][0]["data"]["percent"] == 100:
+                    break
+
+            # limit execution time to the deadline
+            remaining = deadline - clock()
+            if remaining <= 0:
+                break
+
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_interval)
+
+        return response, clock() - start
+
+    def write_hash_cache(self, hashes):
+        """
+        This method is used to write the configuration hashes to the hash_cache file. The file is replaced atomically so
+        that other module runs never read a partial file.
+
+        :param hashes: Type dict.
+                       The configuration hashes keyed by FortiManager and object url.
+        """
+        temp_file = "{}.{}".format(self.hash_cache, os.getpid())
+        with os.fdopen(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as cache:
+            json.dump(hashes, cache)
+        os.rename(temp_file, self.hash_cache)
+
+    def write_lease(self, lease):
+        """
+        This method is used to write a workspace transaction to the lease_file. The file is only readable by its owner,
+        as it holds the session of the transaction, and is replaced atomically so that other module runs never read a
+        partial file.
+
+        :param lease: Type dict.
+                      The transaction to write.
+        """
+        temp_file = "{}.{}".format(self.lease_file, os.getpid())
+        with os.fdopen(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as lease_file:
+            json.dump(lease, lease_file)
+        os.rename(temp_file, self.lease_file)
+
+    def write_session_cache(self, sessions):
+        """
+        This method is used to write the sessions to the session_cache file. The file is only readable by its owner and
+        is replaced atomically so that other module runs never read a partial file.
+
+        :param sessions: Type dict.
+                         The cached sessions keyed by host, port, and user.
+        """
+        temp_file = "{}.{}".format(self.session_cache, os.getpid())
+        with os.fdopen(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as cache:
+            json.dump(sessions, cache)
+        os.rename(temp_file, self.session_cache)
+
+
+class FMState(FortiManager):
+    """
+    This is the class used to converge the configuration of an ADOM to a desired state. The existing configuration of
+    each endpoint is retrieved once, a plan of changes is computed locally using the get_diff methods, and the plan is
+    applied in dependency order using batched requests under a single lock.
+    """
+
+    def __init__(self, host, user, passw, use_ssl=True, verify=False, adom="", package="", api_endpoint="", **kwargs):
+        super(FMState, self).__init__(host, user, passw, use_ssl, verify, adom, package, api_endpoint, **kwargs)
+
+    def apply_plan(self, plan):
+        """
+        This method is used to send the steps of a plan returned by the get_plan method using batched requests. No
+        further steps are sent once a step fails, as later steps may reference the objects that failed.
+
+        :param plan: Type list.
+                     The steps returned by the get_plan method.
+        :return: A list of the changes that failed, each a dict of the endpoint, method, param, and status. An empty
+                 list is returned if every change was successful.
+        """
+        failed = []
+        for step in plan:
+            results = self.make_batch_request(step["method"], step["params"])
+            for endpoint, param, result in zip(step["endpoints"], step["params"], results):
+                if result["status"]["code"] != 0:
+                    failed.append(dict(endpoint=endpoint, method=step["method"], param=param, status=result["status"]))
+            if failed:
+                break
+
+        return failed
+
+    def config_plan(self, module, plan):
+        """
+        This method is used to apply the plan returned by the get_plan method. The ADOM is locked once if the lock param
+        is set to True, and the steps are sent using the apply_plan method. The configuration is saved and unlocked once
+        every step succeeds; otherwise the ADOM is unlocked without saving and the module fails with the list of changes
+        that failed.
+
+        :param module: The Ansible Module instance started by the task.
+        :param plan: Type list.
+                     The steps returned by the get_plan method.
+        :return: A list of dictionaries that correspond to the configuration that was sent in the request bodies to the
+                 FortiManager API. This list will map to the "config" key returned by the Ansible Module.
+        """
+        # lock config if set and module not in check mode
+        if module.params["lock"] and not module.check_mode:
+            self.config_lock(module)
+
+        # configure if not in check mode
+        if not module.check_mode:
+            failed = self.apply_plan(plan)
+
+            # attempt to unlock without saving if any change was unsuccessful
+            if failed and module.params["lock"]:
+                self.config_unlock(module, msg=failed, saved=False)
+                module.fail_json(msg="Unable to Apply all Changes", failed=failed, locked=True, saved=False,
+                                 unlocked=True)
+            elif failed:
+                module.fail_json(msg="Unable to Apply all Changes", failed=failed)
+            elif module.params["lock"]:
+                self.config_commit(module)
+
+        return self.get_plan_config(plan)
+
+    def get_diff_add_mapping(self, proposed_map, mapping):
+        """
+        This method is used to get the difference between the fields of a proposed configuration and an existing
+        configuration or dynamic_mapping. List fields in replace_fields are replaced instead of appended to.
+
+        :param proposed_map: Type dict.
+                             The fields, without the "_scope" or "dynamic_mapping" keys, that should exist.
+        :param mapping: Type dict.
+                        The existing configuration or mapping.
+        :return: A dict of the fields that need to be updated. An empty dict is returned if there is no change.
+        """
+        updated_map = {}
+        for field in proposed_map.keys():
+            # only consider relevant fields that have a difference
+            if field in mapping and proposed_map[field] != mapping[field]:
+                # check for lists that need to be replaced instead of appended.
+                if field in self.replace_fields:
+                    updated_map[field] = proposed_map[field]
+                elif type(mapping[field]) is list:
+                    diff, added = FortiManager.get_member_union(proposed_map[field], mapping[field])
+                    if added:
+                        updated_map[field] = diff
+                elif type(mapping[field]) is dict:
+                    updated_map[field] = dict(set(proposed_map[field].items()).union(mapping[field].items()))
+                elif type(mapping[field]) is str or type(mapping[field]) is unicode or type(mapping[field]) is int:
+                    updated_map[field] = proposed_map[field]
+            elif field not in mapping:
+                updated_map[field] = proposed_map[field]
+
+        return updated_map
+
+    def get_diff_state(self, proposed, existing, id_field):
+        """
+        This method is used to get the difference between the desired configuration of an object and its existing
+        configuration. The fields of the object are compared using the get_diff_add_mapping method, and dynamic_mapping
+        entries using the get_diff_add_map method.
+
+        :param proposed: Type dict.
+                         The configuration that should exist for the object on the FortiManager.
+        :param existing: Type dict.
+                         The current configuration for the object that potentially needs its configuration modified.
+        :param id_field: Type str.
+                         The field used to identify the object in an "update" request.
+        :return: A dict corresponding to the "data" portion of an "update" request. An empty dict is returned if there
+                 is no change.
+        """
+        fields = dict((k, v) for k, v in proposed.items() if k != "dynamic_mapping")
+        config = self.get_diff_add_mapping(fields, existing)
+        if proposed.get("dynamic_mapping"):
+            diff = self.get_diff_add_map(dict(name=proposed.get("name"), dynamic_mapping=proposed["dynamic_mapping"]),
+                                         existing)
+            if diff:
+                config["dynamic_mapping"] = diff["dynamic_mapping"]
+
+        if config:
+            config[id_field] = existing[id_field]
+
+        return config
+
+    def get_endpoint_configs(self, endpoint, configs):
+        """
+        This method is used to group the desired configurations of an endpoint by the url of the table they belong to.
+        Routes are grouped by their FortiGate and VDOM, and the fortigate and vdom keys are removed from each route.
+
+        :param endpoint: Type str.
+                         The API endpoint of the configurations.
+        :param configs: Type list.
+                        The desired configurations of the endpoint.
+        :return: A list of (url, configs) tuples, in the order each url first appears in configs.
+        """
+        if endpoint == "policy":
+            return [("/pm/config/adom/{}/pkg/{}/firewall/{}".format(self.adom, self.package, endpoint), configs)]
+        elif endpoint != "router/static":
+            return [("/pm/config/adom/{}/obj/firewall/{}".format(self.adom, endpoint), configs)]
+
+        groups = []
+        urls = {}
+        for config in configs:
+            url = "/pm/config/device/{}/vdom/{}/router/static".format(config["fortigate"], config.get("vdom", "root"))
+            if url not in urls:
+                urls[url] = []
+                groups.append((url, urls[url]))
+            urls[url].append(dict((k, v) for k, v in config.items() if k not in ["fortigate", "vdom"]))
+
+        return groups
+
+    def get_plan(self, module, desired, state="present"):
+        """
+        This method is used to compute the changes needed to converge the ADOM to the desired state. The existing
+        table of each endpoint, or of each FortiGate and VDOM for routes, is retrieved once, and every desired object is
+        compared against it locally. The changes are then ordered in layers using a ChangeGraph, so each change is only
+        sent after the changes to the objects it references; objects are deleted in the reverse order.
+
+        :param module: The Ansible Module instance started by the task.
+        :param desired: Type dict.
+                        The desired state, mapping keys of ENDPOINTS to lists of configuration dictionaries.
+        :param state: Type str.
+                      The desired state of the objects; present adds and updates objects, and absent deletes them.
+        :return: A tuple of the plan and a summary. The plan is a list of steps, each a dict of the layer, the method,
+                 and the params and endpoints of every change in the layer using that method. The summary has the number
+                 of objects added, updated, deleted, and left unchanged for each endpoint.
+        """
+        changes = []
+        summary = {}
+        for key, endpoint, id_field, replace in ENDPOINTS:
+            if not desired.get(key):
+                continue
+
+            self.replace_fields = replace
+            counts = dict(added=0, updated=0, deleted=0, unchanged=0)
+            for url, configs in self.get_endpoint_configs(endpoint, desired[key]):
+                existing = dict((self.get_state_key(endpoint, entry), entry) for entry in self.get_paged(url))
+                for proposed in configs:
+                    current = existing.get(self.get_state_key(endpoint, proposed))
+                    if state == "absent":
+                        if current is not None:
+                            # the existing config is used to find the references of the object being deleted
+                            param = {"url": url + "/{}".format(current[id_field])}
+                            changes.append(dict(endpoint=key, method="delete", name=current.get("name"),
+                                                config=current, param=param))
+                            counts["deleted"] += 1
+                        continue
+                    elif current is None:
+                        changes.append(dict(endpoint=key, method="add", name=proposed.get("name"), config=proposed,
+                                            param={"url": url, "data": proposed}))
+                        counts["added"] += 1
+                        continue
+
+                    diff = self.get_diff_state(proposed, current, id_field)
+                    if "device" in diff and endpoint == "router/static":
+                        module.fail_json(msg="This module does not support updating a route's associated interface. "
+                                             "This can be achieved by first running a task to delete the existing "
+                                             "route.", existing=current)
+                    elif diff:
+                        changes.append(dict(endpoint=key, method="update", name=proposed.get("name"), config=diff,
+                                            param={"url": url, "data": diff}))
+                        counts["updated"] += 1
+
+            counts["unchanged"] = len(desired[key]) - counts["added"] - counts["updated"] - counts["deleted"]
+            summary[key] = counts
+
+        graph = ChangeGraph(changes)
+        layers = graph.get_layers()
+        if layers is None:
+            module.fail_json(msg="Unable to Order Changes with Circular References",
+                             changes=[dict(endpoint=changes[index]["endpoint"], name=changes[index]["name"])
+                                      for index in graph.unordered])
+        elif state == "absent":
+            layers.reverse()
+
+        plan = []
+        for layer, indexes in enumerate(layers):
+            for method in ["add", "update", "delete"]:
+                layer_changes = [changes[index] for index in indexes if changes[index]["method"] == method]
+                if layer_changes:
+                    plan.append(dict(layer=layer, method=method,
+                                     endpoints=[change["endpoint"] for change in layer_changes],
+                                     params=[change["param"] for change in layer_changes]))
+
+        return plan, summary
+
+    @staticmethod
+    def get_plan_config(plan):
+        """
+        This method is used to get the requests sent for a plan returned by the get_plan method.
+
+        :param plan: Type list.
+                     The steps returned by the get_plan method.
+        :return: A list of dictionaries of the method and params of each step. This list will map to the "config" key
+                 returned by the Ansible Module.
+        """
+        return [{"method": step["method"], "params": step["params"]} for step in plan]
+
+    @staticmethod
+    def get_state_key(endpoint, config):
+        """
+        This method is used to get the key that matches a desired configuration to an existing configuration. Routes
+        are matched by their destination and gateway, and all other configurations by their name.
+
+        :param endpoint: Type str.
+                         The API endpoint of the configuration.
+        :param config: Type dict.
+                       The desired or existing configuration.
+        :return: The key of the configuration.
+        """
+        if endpoint == "router/static":
+            destination = config.get("dstaddr") or config.get("dst")
+            return json.dumps(FortiManager.normalize_config([destination, config.get("gateway")]))
+
+        return config.get("name")
+
+
+class ChangeGraph(object):
+    """
+    This is the class used to order changes by the references between objects. Each change depends on the changes to
+    the objects named in its reference fields, as defined in REFERENCES, and changes are grouped into layers where every
+    change only depends on changes in earlier layers. The changes in a layer are independent of each other, so they can
+    be sent in a single batched request.
+
+    :param changes: Type list.
+                    The changes to order, each a dict with at least the endpoint, name, and config keys.
+    """
+
+    def __init__(self, changes):
+        self.changes = changes
+        self.unordered = []
+        names = dict(((change["endpoint"], change["name"]), index) for index, change in enumerate(changes)
+                     if change["name"])
+
+        self.depends = []
+        self.dependents = [[] for change in changes]
+        for index, change in enumerate(changes):
+            depends = set()
+            for field, endpoints in REFERENCES.get(change["endpoint"], {}).items():
+                members = change["config"].get(field) or []
+                if type(members) is not list:
+                    members = [members]
+                for member in members:
+                    for endpoint in endpoints:
+                        depend = names.get((endpoint, member))
+                        if depend is not None:
+                            depends.add(depend)
+
+            self.depends.append(depends)
+            for depend in depends:
+                self.dependents[depend].append(index)
+
+    def get_layers(self):
+        """
+        This method is used to group the changes into layers in topological order. Changes that can not be placed in a
+        layer because they are part of, or depend on, circular references are stored in the unordered attribute.
+
+        :return: A list of layers, each a list of change indexes in the order the changes were given. None is returned
+                 if the references between changes are circular.
+        """
+        remaining = [len(depends) for depends in self.depends]
+        layer = [index for index, count in enumerate(remaining) if not count]
+        layers = []
+        while layer:
+            layers.append(layer)
+            next_layer = []
+            for index in layer:
+                for dependent in self.dependents[index]:
+                    remaining[dependent] -= 1
+                    if not remaining[dependent]:
+                        next_layer.append(dependent)
+            layer = sorted(next_layer)
+
+        self.unordered = [index for index, count in enumerate(remaining) if count]
+        if self.unordered:
+            return None
+
+        return layers
+
+
+class Rollout(object):
+    """
+    This is the class used to converge several ADOMs to the same desired state in parallel. Each ADOM is converged by
+    its own FMState instance, with its own session and lock, and at most forks ADOMs are converged at a time. With the
+    "all" rollback policy, the changes to every ADOM are held in its locked workspace until all ADOMs are applied, and
+    are then saved, or discarded by unlocking without saving if any ADOM failed. With the "failed" rollback policy,
+    each ADOM is saved as soon as its changes are applied, and only the ADOMs that failed are discarded.
+
+    :param module: The Ansible Module instance started by the task.
+    :param targets: Type list.
+                    The ADOMs to converge, each a dict of the adom and package.
+    :param desired: Type dict.
+                    The desired state, mapping keys of ENDPOINTS to lists of configuration dictionaries.
+    :param connection: Type dict.
+                       The args used to create the FMState instance of each ADOM, other than the adom and package.
+    """
+
+    def __init__(self, module, targets, desired, connection):
+        self.module = RolloutModule(module)
+        self.connection = connection
+        self.desired = desired
+        self.forks = module.params["forks"]
+        self.rollback = module.params["rollback"]
+        self.state = module.params["state"]
+        self.lock = threading.Lock()
+        self.pending = []
+        self.sessions = {}
+        self.results = [dict(adom=target["adom"], package=target["package"], changed=False, config=[], summary={},
+                             status="unchanged") for target in targets]
+
+    def apply(self, result):
+        """
+        This method is used to plan and apply the changes to an ADOM. The ADOM is left locked with its changes applied,
+        unless the rollback policy is "failed", in which case it is saved and unlocked. If any change fails, the ADOM
+        is unlocked without saving.
+
+        :param result: Type dict.
+                       The result of the ADOM, which is updated with its plan, status, and lock values.
+        """
+        session = FMState(adom=result["adom"], package=result["package"], **self.connection)
+        self.sessions[result["adom"]] = session
+        try:
+            if session.login().json()["result"][0]["status"]["code"] != 0:
+                raise RolloutError(dict(msg="Unable to login"))
+
+            plan, result["summary"] = session.get_plan(self.module, self.desired, self.state)
+            result["config"] = session.get_plan_config(plan)
+            if plan and self.module.check_mode:
+                result.update(changed=True, status="planned")
+            elif plan:
+                if self.module.params["lock"]:
+                    session.config_lock(self.module)
+                    result.update(locked=True, lock_wait=session.lock_wait)
+
+                failed = session.apply_plan(plan)
+                result.update(changed=True, status="applied")
+                if failed:
+                    raise RolloutError(dict(msg="Unable to Apply all Changes", failed=failed))
+        except RolloutError as error:
+            result.update(error.args[0], status="failed")
+        except Exception as error:
+            result.update(msg="Unable to Converge the ADOM: {}".format(error), status="failed")
+
+        if result["status"] == "failed" and result.get("locked"):
+            self.discard(result)
+        elif result["status"] == "applied" and result.get("locked") and self.rollback == "failed":
+            self.commit(result)
+        elif result["status"] != "applied" or not result.get("locked"):
+            session.logout()
+
+    def commit(self, result):
+        """
+        This method is used to save the changes applied to an ADOM and unlock it.
+
+        :param result: Type dict.
+                       The result of the ADOM, which is updated with its status and save and unlock values.
+        """
+        session = self.sessions[result["adom"]]
+        try:
+            session.config_commit(self.module)
+        except RolloutError as error:
+            result.update(error.args[0], status="failed")
+            return
+
+        result.update(saved=True, unlocked=True, status="saved")
+        session.logout()
+
+    def discard(self, result):
+        """
+        This method is used to discard the changes applied to an ADOM by unlocking it without saving.
+
+        :param result: Type dict.
+                       The result of the ADOM, which is updated with its status and save and unlock values.
+        """
+        session = self.sessions[result["adom"]]
+        unlocked = session.unlock()["result"][0]["status"]["code"] == 0
+        result.update(saved=False, unlocked=unlocked)
+        if result["status"] == "applied":
+            result["status"] = "discarded"
+
+        session.logout()
+
+    def run(self):
+        """
+        This method is used to converge every ADOM and then save or discard the ADOMs left locked, following the
+        rollback policy.
+
+        :return: A list of the result of each ADOM, in the order the ADOMs were given.
+        """
+        self.run_threads(self.apply, self.results)
+        locked = [result for result in self.results if result["status"] == "applied" and result.get("locked")]
+        if self.rollback == "all" and [result for result in self.results if result["status"] == "failed"]:
+            self.run_threads(self.discard, locked)
+        else:
+            self.run_threads(self.commit, locked)
+
+        return self.results
+
+    def run_threads(self, function, results):
+        """
+        This method is used to call a function for the result of each ADOM, using at most forks threads at a time.
+
+        :param function: Type function.
+                         The method called with the result of each ADOM.
+        :param results: Type list.
+                        The results of the ADOMs to call the function for.
+        """
+        self.pending = list(results)
+        threads = [threading.Thread(target=self.run_worker, args=(function,))
+                   for fork in range(min(self.forks, len(results)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def run_worker(self, function):
+        """
+        This method is used by each thread to call a function for the pending ADOMs until none are left. The time spent
+        on each ADOM is added to its elapsed value.
+
+        :param function: Type function.
+                         The method called with the result of each ADOM.
+        """
+        while True:
+            with self.lock:
+                if not self.pending:
+                    return
+                result = self.pending.pop(0)
+
+            start = time.time()
+            try:
+                function(result)
+            except Exception as error:
+                # a thread can not end the module, so unexpected errors are recorded as a failure of the ADOM
+                result.update(msg="Unable to Converge the ADOM: {}".format(error), status="failed")
+            result["elapsed"] = round(result.get("elapsed", 0) + time.time() - start, 2)
+
+
+class RolloutError(Exception):
+    """
+    This is the exception raised for the failure of an ADOM in a Rollout; its only arg is the dict of values that were
+    passed to fail_json.
+    """
+    pass
+
+
+class RolloutModule(object):
+    """
+    This is the class used in place of the Ansible Module by the threads of a Rollout. The Ansible Module can only be
+    ended once, by the main thread, so failures are raised as a RolloutError and recorded in the result of the ADOM.
+
+    :param module: The Ansible Module instance started by the task.
+    """
+
+    def __init__(self, module):
+        self.check_mode = module.check_mode
+        self.params = module.params
+
+    @staticmethod
+    def fail_json(**kwargs):
+        raise RolloutError(kwargs)
+
+
+# the order each table is retrieved and summarized in; changes are ordered using the REFERENCES between objects
+ENDPOINTS = [
+    ("addresses", "address", "name", ["subnet", "associated-interface"]),
+    ("address_groups", "addrgrp", "name", []),
+    ("services", "service/custom", "name", []),
+    ("service_groups", "service/group", "name", []),
+    ("vips", "vip", "name", ["extintf", "extip"]),
+    ("vip_groups", "vipgrp", "name", ["interface"]),
+    ("ip_pools", "ippool", "name", ["arp-intf"]),
+    ("routes", "router/static", "seq-num", ["device"]),
+    ("policies", "policy", "policyid", ["natip", "schedule"])
+]
+
+# the fields of each endpoint that reference other objects, and the endpoints the referenced objects can belong to
+REFERENCES = {
+    "address_groups": {"member": ["addresses", "address_groups"]},
+    "service_groups": {"member": ["services", "service_groups"]},
+    "vip_groups": {"member": ["vips"]},
+    "routes": {"dstaddr": ["addresses", "address_groups"]},
+    "policies": {"dstaddr": ["addresses", "address_groups", "vips", "vip_groups"], "poolname": ["ip_pools"],
+                 "service": ["services", "service_groups"], "srcaddr": ["addresses", "address_groups"]}
+}
+
+
+def load_state(src):
+    """
+    This function is used to load the desired state from a YAML or JSON file.
+
+    :param src: Type str.
+                The path of the file.
+    :return: The desired state dictionary.
+    """
+    with open(src) as src_file:
+        return yaml.safe_load(src_file) or {}
+
+
+def main():
+    argument_spec = dict(
+        adom=dict(required=False, type="str"),
+        adoms=dict(required=False, type="list"),
+        broker_socket=dict(required=False, type="path"),
+        forks=dict(default=5, type="int"),
+        host=dict(required=True, type="str"),
+        lease_file=dict(required=False, type="path"),
+        lock=dict(default=True, type="bool"),
+        lock_timeout=dict(default=0, type="int"),
+        package=dict(required=False, type="str"),
+        password=dict(fallback=(env_fallback, ["ANSIBLE_NET_PASSWORD"]), no_log=True),
+        pool_size=dict(default=10, type="int"),
+        port=dict(required=False, type="int"),
+        provider=dict(required=False, type="dict"),
+        rollback=dict(choices=["all", "failed"], default="all", type="str"),
+        session_cache=dict(required=False, type="path"),
+        session_cache_ttl=dict(default=3600, type="int"),
+        session_id=dict(required=False, type="str"),
+        state=dict(choices=["absent", "present"], default="present", type="str"),
+        timeout=dict(required=False, type="int"),
+        use_ssl=dict(default=True, type="bool"),
+        username=dict(fallback=(env_fallback, ["ANSIBLE_NET_USERNAME"])),
+        validate_certs=dict(default=False, type="bool"),
+        desired_state=dict(required=False, type="dict"),
+        src=dict(required=False, type="path")
+    )
+
+    mutually_exclusive = [["desired_state", "src"], ["adom", "adoms"], ["adoms", "broker_socket"],
+                          ["adoms", "lease_file"], ["adoms", "session_cache"], ["adoms", "session_id"]]
+    module = AnsibleModule(argument_spec, supports_check_mode=True, mutually_exclusive=mutually_exclusive,
+                           required_one_of=[["desired_state", "src"], ["adom", "adoms"]])
+    provider = module.params["provider"] or {}
+
+    # prevent secret params in provider from logging
+    no_log = ["password"]
+    for param in no_log:
+        if provider.get(param):
+            module.no_log_values.update(return_values(provider[param]))
+
+    # allow local params to override provider
+    for param, pvalue in provider.items():
+        if module.params.get(param) is None:
+            module.params[param] = pvalue
+
+    adom = module.params["adom"]
+    host = module.params["host"]
+    package = module.params["package"]
+    password = module.params["password"]
+    port = module.params["port"]
+    session_id = module.params["session_id"]
+    state = module.params["state"]
+    use_ssl = module.params["use_ssl"]
+    username = module.params["username"]
+    validate_certs = module.params["validate_certs"]
+    desired = module.params["desired_state"]
+
+    if module.params["src"]:
+        try:
+            desired = load_state(module.params["src"])
+        except (IOError, ValueError, yaml.YAMLError) as error:
+            module.fail_json(msg="Unable to Load Desired State from src: {}".format(error))
+
+    # validate the desired state before retrieving anything from the FortiManager
+    unknown = set(desired).difference([endpoint[0] for endpoint in ENDPOINTS])
+    if unknown:
+        module.fail_json(msg="Invalid Desired State", unknown=list(unknown))
+    elif desired.get("policies") and not package and not module.params["adoms"]:
+        module.fail_json(msg="The package param is required to manage policies")
+    elif desired.get("routes") and module.params["adoms"]:
+        # device routes are shared by every adom, so each adom would write the same routes
+        module.fail_json(msg="Routes can not be Managed with adoms; Converge Routes using a single adom")
+
+    for key, endpoint, id_field, replace in ENDPOINTS:
+        for config in desired.get(key) or []:
+            if endpoint == "router/static":
+                valid = config.get("fortigate") and config.get("gateway")
+                valid = valid and (config.get("dst") or config.get("dstaddr"))
+            else:
+                valid = config.get("name")
+            if not valid:
+                module.fail_json(msg="Invalid Desired State Definition", endpoint=key, config=config)
+
+    kwargs = dict(pool_size=module.params["pool_size"], timeout=module.params["timeout"])
+    if port:
+        kwargs["port"] = port
+
+    # converge each ADOM in parallel using its own session and lock
+    if module.params["adoms"]:
+        targets = []
+        for target in module.params["adoms"]:
+            if type(target) is not dict:
+                target = dict(adom=target)
+            target = dict(adom=target.get("adom"), package=target.get("package") or package)
+            if not target["adom"] or (desired.get("policies") and not target["package"]):
+                module.fail_json(msg="Each ADOM Requires an adom, and a package to manage policies", target=target)
+            targets.append(target)
+
+        connection = dict(host=host, user=username, passw=password, use_ssl=use_ssl, verify=validate_certs,
+                          lock_timeout=module.params["lock_timeout"], **kwargs)
+        adoms = Rollout(module, targets, desired, connection).run()
+        changed = bool([result for result in adoms if result["status"] in ["applied", "planned", "saved"]])
+        failed = [result["adom"] for result in adoms if result["status"] == "failed"]
+        if failed:
+            module.fail_json(msg="Unable to Converge all ADOMs", failed_adoms=failed, adoms=adoms, changed=changed)
+
+        return module.exit_json(changed=changed, adoms=adoms)
+
+    # validate successful login or use established session id
+    session = FMState(host, username, password, use_ssl, validate_certs, adom, package,
+                      session_cache=module.params["session_cache"],
+                      session_cache_ttl=module.params["session_cache_ttl"],
+                      broker_socket=module.params["broker_socket"],
+                      lock_timeout=module.params["lock_timeout"],
+                      lease_file=module.params["lease_file"],
+                      **kwargs)
+
+    # run within the workspace transaction started by fortimgr_lock if lease_file is set
+    session_id = session.join_lease(module)
+    if not session_id:
+        session_login = session.login()
+        if not session_login.json()["result"][0]["status"]["code"] == 0:
+            module.fail_json(msg="Unable to login")
+    else:
+        session.session = session_id
+
+    # get each existing table once and plan every change locally in dependency order
+    plan, summary = session.get_plan(module, desired, state)
+    results = dict(changed=False, config=[], summary=summary)
+    if plan:
+        results["config"] = session.config_plan(module, plan)
+        results["changed"] = True
+
+        # if module has made it this far and lock set, then all related return values are true
+        if module.params["lock"]:
+            results.update(dict(locked=True, saved=True, unlocked=True, lock_wait=session.lock_wait))
+
+    # logout, build in check for future logging capabilities
+    if not session_id:
+        session_logout = session.logout()
+        # if not session_logout.json()["result"][0]["status"]["code"] == 0:
+        #     results["msg"] = "Completed tasks, but unable to logout of FortiManager"
+        #     module.fail_json(**results)
+
+    return module.exit_json(**results)
+
+
+if __name__ == "__main__":
+    main()
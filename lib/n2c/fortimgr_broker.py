@@ -0,0 +1,427 @@
+#!/usr/bin/python
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+ANSIBLE_METADATA = {
+    "metadata_version": "1.0",
+    "status": ["preview"],
+    "supported_by": "community"
+}
+
+DOCUMENTATION = '''
+---
+module: fortimgr_broker
+version_added: "2.3"
+short_description: Manages a local connection broker for FortiManager modules
+description:
+  - Starts or stops a long-lived local process that forwards jsonrpc requests from FortiManager modules to one or more
+    FortiManagers.
+  - The broker keeps pooled connections and logged in sessions to each FortiManager, so modules using the broker_socket
+    param do not perform a new connection or login for every task.
+  - Identical read requests that are in flight at the same time, such as those issued by parallel forks, are sent to
+    the FortiManager once and the response is shared. A read is not shared with one that started before a write
+    passed through the broker, so every task reads its own writes.
+  - Tasks that lock the ADOM login with a private session instead of the shared one, as the workspace lock belongs to
+    the session.
+  - Modules fall back to connecting directly to the FortiManager if the broker is not running.
+author: Jacob McGill (@jmcgill298)
+options:
+  socket_path:
+    description:
+      - The path of the Unix socket the broker listens on.
+      - The socket is only accessible by the user running the broker.
+    required: true
+    type: str
+  state:
+    description:
+      - The desired state of the broker.
+      - started will start the broker if it is not already running.
+      - stopped will stop the broker and logout of every session it holds.
+    required: false
+    default: started
+    type: str
+    choices: ["started", "stopped"]
+  idle_timeout:
+    description:
+      - The number of seconds without requests after which the broker stops itself.
+    required: false
+    default: 3600
+    type: int
+'''
+
+EXAMPLES = '''
+- name: Start Broker
+  fortimgr_broker:
+    socket_path: "/tmp/fortimgr_broker.sock"
+  run_once: True
+- name: Make Change
+  fortimgr_address:
+    host: "{{ inventory_hostname }}"
+    username: "{{ username }}"
+    password: "{{ password }}"
+    broker_socket: "/tmp/fortimgr_broker.sock"
+    adom: "lab"
+    address_name: "Server01"
+    address_type: "ipmask"
+    subnet:
+      - "10.1.1.1"
+      - "255.255.255.255"
+- name: Stop Broker
+  fortimgr_broker:
+    socket_path: "/tmp/fortimgr_broker.sock"
+    state: "stopped"
+  run_once: True
+'''
+
+RETURN = '''
+socket_path:
+    description: The path of the Unix socket the broker listens on.
+    returned: always
+    type: str
+    sample: "/tmp/fortimgr_broker.sock"
+running:
+    description: States whether the broker is running after module execution.
+    returned: always
+    type: bool
+    sample: True
+'''
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import requests
+from ansible.module_utils.basic import AnsibleModule
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+requests.packages.urllib3.disable_warnings()
+
+
+class Broker(object):
+    """
+    This is the class used by the broker process to forward jsonrpc requests to FortiManagers. Connections are pooled
+    per FortiManager url, login sessions are shared between clients using the same credentials, and identical "get"
+    requests that are in flight at the same time are only sent once. The generation is incremented when a write
+    starts and when it completes, and reads are only coalesced within a generation, so a read never shares the
+    response of a read that may have been answered before a write.
+    """
+
+    def __init__(self, idle_timeout):
+        """
+        :param idle_timeout: Type int.
+                             The number of seconds without requests after which the broker stops.
+        """
+        self.idle_timeout = idle_timeout
+        self.generation = 0
+        self.http_sessions = {}
+        self.inflight = {}
+        self.last_request = time.time()
+        self.lock = threading.Lock()
+        self.login_lock = threading.Lock()
+        self.logins = {}
+        self.stopped = False
+
+    def coalesce(self, request):
+        """
+        This method is used to send a "get" request, sharing the response with any identical request received while it
+        is in flight and no write has passed through the broker.
+
+        :param request: Type dict.
+                        The request received from the client.
+        :return: The reply to send to the client.
+        """
+        with self.lock:
+            key = "{}|{}{}".format(self.generation, request["url"], json.dumps(request["body"], sort_keys=True))
+            entry = self.inflight.get(key)
+            leader = entry is None
+            if leader:
+                entry = dict(event=threading.Event(), reply=None)
+                self.inflight[key] = entry
+
+        if leader:
+            try:
+                entry["reply"] = self.post(request)
+            finally:
+                with self.lock:
+                    self.inflight.pop(key, None)
+                entry["event"].set()
+        else:
+            entry["event"].wait()
+
+        return entry["reply"]
+
+    def dispatch(self, request):
+        """
+        This method is used to handle a request received from a client.
+
+        :param request: Type dict.
+                        The request received from the client, either a command or a url, verify, timeout, and jsonrpc
+                        body to send to the FortiManager.
+        :return: The reply to send to the client.
+        """
+        self.last_request = time.time()
+        if request.get("command") == "ping":
+            return dict(status="running")
+        elif request.get("command") == "shutdown":
+            self.stopped = True
+            return dict(status="stopped")
+
+        body = request["body"]
+        method = body.get("method")
+        url = (body.get("params") or [{}])[0].get("url")
+
+        try:
+            if method == "exec" and url == "/sys/login/user":
+                return self.login(request)
+            elif method == "exec" and url == "/sys/logout" and body.get("session") in self.logins.values():
+                # sessions held by the broker are reused by later clients and logged out when the broker stops
+                return dict(status_code=200, content=json.dumps(
+                    {"result": [{"status": {"code": 0, "message": "OK"}, "url": "/sys/logout"}]}))
+            elif method == "get":
+                return self.coalesce(request)
+            else:
+                return self.write(request)
+        except Exception as error:
+            return dict(error=str(error))
+
+    def login(self, request):
+        """
+        This method is used to return the session held for the request's FortiManager and credentials. The held session
+        is validated with a status request, and a new login is only made if there is no valid session.
+
+        :param request: Type dict.
+                        The login request received from the client.
+        :return: The reply to send to the client.
+        """
+        data = request["body"]["params"][0]["data"]
+        digest = hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+        key = "{}|{}".format(request["url"], digest)
+
+        with self.login_lock:
+            session = self.logins.get(key)
+            if session:
+                status = dict(request, body=dict(method="get", params=[dict(url="/sys/status")], session=session))
+                reply = self.post(status)
+                if json.loads(reply["content"])["result"][0]["status"]["code"] == 0:
+                    content = {"result": [{"status": {"code": 0, "message": "OK"}, "url": "/sys/login/user"}],
+                               "session": session}
+                    return dict(status_code=200, content=json.dumps(content))
+
+            reply = self.post(request)
+            session = json.loads(reply["content"]).get("session")
+            if session:
+                self.logins[key] = session
+            else:
+                self.logins.pop(key, None)
+
+        return reply
+
+    def logout_all(self):
+        """
+        This method is used to logout of every session held by the broker.
+        """
+        for key, session in self.logins.items():
+            url = key.split("|")[0]
+            request = dict(url=url, verify=False, timeout=10,
+                           body=dict(method="exec", params=[{"url": "/sys/logout"}], session=session))
+            try:
+                self.post(request)
+            except Exception:
+                pass
+
+        self.logins = {}
+
+    def post(self, request):
+        """
+        This method is used to send a request to the FortiManager using the pooled connections for its url.
+
+        :param request: Type dict.
+                        The request received from the client.
+        :return: The reply to send to the client.
+        """
+        with self.lock:
+            http_session = self.http_sessions.get(request["url"])
+            if http_session is None:
+                http_session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=50)
+                http_session.mount("https://", adapter)
+                http_session.mount("http://", adapter)
+                self.http_sessions[request["url"]] = http_session
+
+        timeout = request.get("timeout")
+        if type(timeout) is list:
+            timeout = tuple(timeout)
+
+        response = http_session.post(request["url"], json=request["body"], verify=request.get("verify", False),
+                                     timeout=timeout)
+
+        return dict(status_code=response.status_code, content=response.text)
+
+    def write(self, request):
+        """
+        This method is used to send a request that may change the FortiManager's configuration. The generation is
+        incremented before and after the request, so reads received from then on are not coalesced with reads that
+        started before the write completed.
+
+        :param request: Type dict.
+                        The request received from the client.
+        :return: The reply to send to the client.
+        """
+        with self.lock:
+            self.generation += 1
+        try:
+            return self.post(request)
+        finally:
+            with self.lock:
+                self.generation += 1
+
+
+class BrokerHandler(socketserver.StreamRequestHandler):
+    """
+    This is the class used to handle a client connection; each connection carries one request and its reply, encoded
+    as a single line of JSON.
+    """
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode("utf-8"))
+        reply = self.server.broker.dispatch(request)
+        self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+
+class BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    This is the class used to accept client connections on the broker's Unix socket, using a thread per connection.
+    """
+    daemon_threads = True
+    timeout = 1
+
+
+def broker_request(socket_path, request):
+    """
+    This function is used to send a request to the broker.
+
+    :param socket_path: Type str.
+                        The path of the broker's Unix socket.
+    :param request: Type dict.
+                    The request to send.
+    :return: The reply from the broker, or None if the broker is not running.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        return json.loads(client.makefile("rb").readline().decode("utf-8"))
+    except (socket.error, ValueError):
+        return None
+    finally:
+        client.close()
+
+
+def run_broker(socket_path, idle_timeout):
+    """
+    This function is used to run the broker until it is stopped or has been idle for idle_timeout seconds.
+
+    :param socket_path: Type str.
+                        The path of the Unix socket to listen on.
+    :param idle_timeout: Type int.
+                         The number of seconds without requests after which the broker stops.
+    """
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    server = BrokerServer(socket_path, BrokerHandler)
+    server.broker = Broker(idle_timeout)
+    try:
+        while not server.broker.stopped and time.time() - server.broker.last_request < idle_timeout:
+            server.handle_request()
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+        server.broker.logout_all()
+
+
+def start_broker(socket_path, idle_timeout):
+    """
+    This function is used to start the broker as a daemon process and wait for it to accept connections.
+
+    :param socket_path: Type str.
+                        The path of the Unix socket to listen on.
+    :param idle_timeout: Type int.
+                         The number of seconds without requests after which the broker stops.
+    :return: True if the broker is accepting connections.
+    """
+    pid = os.fork()
+    if pid:
+        os.waitpid(pid, 0)
+        for attempt in range(50):
+            if broker_request(socket_path, dict(command="ping")):
+                return True
+            time.sleep(0.1)
+
+        return False
+
+    # detach from the module process so the broker outlives the task
+    os.setsid()
+    if os.fork():
+        os._exit(0)
+
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in range(3):
+        os.dup2(devnull, fd)
+    os.umask(0o077)
+
+    try:
+        run_broker(socket_path, idle_timeout)
+    finally:
+        os._exit(0)
+
+
+def main():
+    argument_spec = dict(
+        socket_path=dict(required=True, type="path"),
+        state=dict(choices=["started", "stopped"], default="started", type="str"),
+        idle_timeout=dict(default=3600, type="int")
+    )
+
+    module = AnsibleModule(argument_spec, supports_check_mode=True)
+    socket_path = module.params["socket_path"]
+    state = module.params["state"]
+    idle_timeout = module.params["idle_timeout"]
+
+    running = broker_request(socket_path, dict(command="ping")) is not None
+    results = dict(changed=False, running=running, socket_path=socket_path)
+
+    if state == "started" and not running:
+        results.update(changed=True, running=True)
+        if not module.check_mode and not start_broker(socket_path, idle_timeout):
+            module.fail_json(msg="Unable to Start the Broker", running=False, socket_path=socket_path)
+    elif state == "stopped" and running:
+        results.update(changed=True, running=False)
+        if not module.check_mode:
+            broker_request(socket_path, dict(command="shutdown"))
+
+    return module.exit_json(**results)
+
+
+if __name__ == "__main__":
+    main()
@@ -36,22 +36,52 @@ options:
       - The ADOM the configuration should belong to.
     required: true
     type: str
+  broker_socket:
+    description:
+      - The path of the Unix socket of a broker started with fortimgr_broker.
+      - Requests are forwarded through the broker, which holds pooled connections and sessions to the FortiManager.
+      - Requests are sent directly to the FortiManager if the broker is not running.
+    required: false
+    type: str
   host:
     description:
       - The FortiManager's Address.
     required: true
     type: str
+  lease_file:
+    description:
+      - The path of the lease file of a workspace transaction started by fortimgr_lock.
+      - The task uses the transaction's session if session_id is not given, and does not lock the ADOM, as the
+        transaction is saved and unlocked by fortimgr_lock.
+      - The successful writes sent by the task are counted in the transaction.
+    required: false
+    type: str
   lock:
     description:
       - True locks the ADOM, makes necessary configuration updates, saves the config, and unlocks the ADOM
     required: false
     default: True
     type: bool
+  lock_timeout:
+    description:
+      - The number of seconds to keep retrying to lock the ADOM while it is locked by another session, waiting a
+        jittered, exponentially increasing interval between attempts.
+      - The default of 0 fails on the first unsuccessful attempt.
+      - If the ADOM can not be locked, the lock info of the session holding the lock is returned as lock_holder.
+    required: false
+    default: 0
+    type: int
   password:
     description:
       - The password associated with the username account.
     required: false
     type: str
+  pool_size:
+    description:
+      - The maximum number of keep-alive connections held open to the FortiManager.
+    required: false
+    default: 10
+    type: int
   port:
     description:
       - The TCP port used to connect to the FortiManager if other than the default used by the transport
@@ -66,6 +96,24 @@ options:
       - Local params take precedence, e.g. hostname is preferred to provider["hostname"] when both are specified.
     required: false
     type: dict
+  session_cache:
+    description:
+      - The path of a file used to share login sessions with other tasks connecting to the same host with the same
+        username.
+      - A cached session is reused while it is valid and is replaced by a new login once it is older than
+        session_cache_ttl.
+      - Tasks using the cache do not logout, so the session remains available to later tasks; use fortimgr_lock with
+        logout to end it.
+      - Tasks that lock the ADOM login with a private session, as the workspace lock belongs to the session.
+    required: false
+    type: str
+  session_cache_ttl:
+    description:
+      - The number of seconds a session stored in session_cache is reused before it is logged out and replaced by a
+        new login.
+    required: false
+    default: 3600
+    type: int
   session_id:
     description:
       - The session_id of an established and active session
@@ -81,6 +129,12 @@ options:
     default: present
     type: str
     choices: ["absent", "param_absent", "present"]
+  timeout:
+    description:
+      - The number of seconds to wait for the FortiManager to accept a connection or respond to a request.
+      - The default waits indefinitely.
+    required: false
+    type: int
   use_ssl:
     description:
       - Determines whether to use HTTPS(True) or HTTP(False).
@@ -187,6 +241,15 @@ options:
       - The name of the Policy.
     required: false
     type: str
+  policy_order:
+    description:
+      - The policy IDs or names in the order they should appear in the package.
+      - Policies not in the list keep their position, and the listed policies are placed in the given relative order
+        using the fewest possible moves.
+      - All moves are made in a single locked batch, and global-labels lost while moving are re-applied.
+      - Can not be used with the policy_id, policy_name, or direction params.
+    required: false
+    type: list
   pool_name:
     description:
       - The name of the IP Pool when enabled.
@@ -288,6 +351,17 @@ EXAMPLES = '''
     package: "prod"
     policy_name: "Permit_Outbound_Web"
     state: "absent"
+- name: Order Policies
+  fortimgr_policy:
+    host: "{{ inventory_hostname }}"
+    username: "{{ username }}"
+    password: "{{ password }}"
+    adom: "prod"
+    package: "prod"
+    policy_order:
+      - "Permit_Outbound_Web"
+      - "Permit_Outbound_DNS"
+      - "Deny_Outbound"
 '''
 
 RETURN = '''
@@ -310,7 +384,8 @@ config:
              "srcaddr": ["lab_admin"], "srcintf": ["any"], "status": "disable"},
              "url": "pm/config/adom/lab/pkg/lab/firewall/policy"}]}
 moved:
-    description: The movement of the policy if specified and required.
+    description: The movement of the policy if specified and required. A list of the moves made when policy_order is
+                 used.
     returned always
     type: dict
     sample: {"id": 1, "method": "move", "params": [{"option": "before", "target": "4",
@@ -320,6 +395,11 @@ locked:
     returned: When lock set to True
     type: bool
     sample: True
+lock_wait:
+    description: The number of seconds spent waiting to lock the ADOM.
+    returned: When lock set to True
+    type: float
+    sample: 4.21
 saved:
     description: The status of the ADOM save command
     returned: When lock set to True
@@ -332,6 +412,13 @@ unlocked:
     sample: True
 '''
 
+import bisect
+import fcntl
+import hashlib
+import json
+import os
+import random
+import socket
 import time
 import requests
 from ansible.module_utils.basic import AnsibleModule, env_fallback, return_values
@@ -345,6 +432,9 @@ class FortiManager(object):
     defined here and inherited by the sub-class.
     """
 
+    # list fields that are replaced instead of appended to; the order of these lists is significant for config hashes
+    replace_fields = []
+
     def __init__(self, host, user, passw, use_ssl=True, verify=False, adom="", package="", api_endpoint="", **kwargs):
         """
         :param host: Type str.
@@ -364,11 +454,35 @@ class FortiManager(object):
                         The FortiManager policy package that should be used.
         :param api_endpoint: Type str.
                              The API endpoint used for a particular configuration section.
-        :param kwargs: Type dict. Currently supports port.
+        :param kwargs: Type dict. Currently supports port, pool_size, timeout, session_cache, session_cache_ttl,
+                       broker_socket, hash_cache, lock_timeout, and lease_file.
         :param headers: Type dict.
                         The headers to include in HTTP requests.
         :param port: Type str.
                      Passing the port parameter will override the default HTTP(S) port when making requests.
+        :param pool_size: Type int.
+                          The maximum number of keep-alive connections held open to the FortiManager. The default is 10.
+        :param timeout: Type int or tuple.
+                        The connect and read timeout in seconds used for each request; a (connect, read) tuple can be
+                        used to set them independently. The default is None, which waits indefinitely.
+        :param session_cache: Type str.
+                              The path of a file used to share login sessions across module runs. Sessions are keyed
+                              by host, port, and user, and are not logged out by the logout method.
+        :param session_cache_ttl: Type int.
+                                  The number of seconds a cached session is reused before it is logged out and replaced
+                                  by a new login. The default is 3600.
+        :param broker_socket: Type str.
+                              The path of the Unix socket of a running fortimgr_broker. Requests are forwarded through
+                              the broker, and are sent directly to the FortiManager if the broker is not running.
+        :param hash_cache: Type str.
+                           The path of a file used to store the hash of the configuration last applied to each object,
+                           so unchanged objects can be skipped without retrieving them from the FortiManager.
+        :param lock_timeout: Type int.
+                             The number of seconds the config_lock method keeps retrying to lock the ADOM while it is
+                             locked by another session. The default is 0, which fails on the first unsuccessful attempt.
+        :param lease_file: Type str.
+                           The path of the lease file of a workspace transaction started by fortimgr_lock. Each
+                           successful write sent by the instance is counted in the lease file.
         """
         self.host = host
         self.user = user
@@ -383,11 +497,32 @@ class FortiManager(object):
         self.wsp_url = "/dvmdb/adom/{}/workspace/".format(self.adom)
         self.headers = {"Content-Type": "application/json"}
         self.port = kwargs.get("port", "")
-
+        self.pool_size = kwargs.get("pool_size", 10)
+        self.timeout = kwargs.get("timeout")
+        self.session_cache = kwargs.get("session_cache")
+        self.session_cache_ttl = kwargs.get("session_cache_ttl", 3600)
+        self.session_cache_key = "{}:{}:{}".format(self.host, self.port, self.user)
+        self.shared_session = False
+        self.broker_socket = kwargs.get("broker_socket")
+        self.brokered = False
+        self.hash_cache = kwargs.get("hash_cache")
+        self.lock_timeout = kwargs.get("lock_timeout") or 0
+        self.lock_wait = 0
+        self.lease_file = kwargs.get("lease_file")
+
+        port = ":{}".format(self.port) if self.port else ""
         if use_ssl:
-            self.url = "https:{port}//{fw}/jsonrpc".format(port=self.port, fw=self.host)
+            self.url = "https://{fw}{port}/jsonrpc".format(port=port, fw=self.host)
         else:
-            self.url = "http:{port}//{fw}/jsonrpc".format(port=self.port, fw=self.host)
+            self.url = "http://{fw}{port}/jsonrpc".format(port=port, fw=self.host)
+
+        # keep-alive connection pool shared by every request made by the instance
+        self.http_session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.http_session.mount("https://", adapter)
+        self.http_session.mount("http://", adapter)
+        self.http_session.headers.update(self.headers)
+        self.http_session.verify = self.verify
 
     def add_config(self, new_config):
         """
@@ -430,6 +565,80 @@ class FortiManager(object):
 
         return {"changed": changed, "config": config, "existing": existing}
 
+    def config_bulk(self, module, adds=[], updates=[], deletes=[]):
+        """
+        This method is used to handle the logic for Ansible modules that change many objects at once. The ADOM is locked
+        once if the lock param is set to True, the changes are sent using batched requests, and the configuration is
+        saved and unlocked once all changes succeed. If any change fails, the ADOM is unlocked without saving and the
+        module fails with the list of changes that failed.
+
+        :param module: The Ansible Module instance started by the task.
+        :param adds: Type list.
+                     The config dictionaries of the objects to add.
+        :param updates: Type list.
+                        The config dictionaries of the object updates, as returned by the get_diff methods.
+        :param deletes: Type list.
+                        The names of the objects to delete.
+        :return: A list of dictionaries that correspond to the configuration that was sent in the request bodies to the
+                 FortiManager API. This list will map to the "config" key returned by the Ansible Module.
+        """
+        changes = [("add", [{"url": self.obj_url, "data": add} for add in adds], [add["name"] for add in adds]),
+                   ("update", [{"url": self.obj_url, "data": update} for update in updates],
+                    [update["name"] for update in updates]),
+                   ("delete", [{"url": self.obj_url + "/{}".format(name)} for name in deletes], deletes)]
+        changes = [change for change in changes if change[1]]
+
+        # lock config if set and module not in check mode
+        if module.params["lock"] and not module.check_mode:
+            self.config_lock(module)
+
+        # configure if not in check mode
+        if not module.check_mode:
+            failed = []
+            for method, params, names in changes:
+                results = self.make_batch_request(method, params)
+                for name, result in zip(names, results):
+                    if result["status"]["code"] != 0:
+                        failed.append(dict(method=method, name=name, status=result["status"]))
+
+            # attempt to unlock without saving if any change was unsuccessful
+            if failed and module.params["lock"]:
+                self.config_unlock(module, msg=failed, saved=False)
+                module.fail_json(msg="Unable to Apply all Changes", failed=failed, locked=True, saved=False,
+                                 unlocked=True)
+            elif failed:
+                module.fail_json(msg="Unable to Apply all Changes", failed=failed)
+            elif module.params["lock"]:
+                self.config_commit(module)
+
+        return [{"method": method, "params": params} for method, params, names in changes]
+
+    def config_commit(self, module):
+        """
+        This method is used to save the configuration and unlock the ADOM when "lock" is set to True. The commit and
+        unlock are sent as two params of a single "exec" request, which the FortiManager runs in order, so the ADOM is
+        unlocked even if the save fails. The result of each step is checked separately, so the module fails with the
+        same message and locked, saved, and unlocked values as when config_save and config_unlock are used.
+
+        :param module: The Ansible Module instance started by the task.
+        :return: True if the configuration was saved and the ADOM unlocked.
+        """
+        save_status, unlock_status = self.save_unlock()["result"]
+        saved = save_status["status"]["code"] == 0
+        unlocked = unlock_status["status"]["code"] == 0
+        if saved and unlocked:
+            return True
+        elif unlocked:
+            msg = "Unable to Save Config, Successfully Unlocked"
+        elif saved:
+            msg = "Config Saved, but Unable to Unlock"
+        else:
+            msg = "Config Updated, but Unable to Save or Unlock"
+
+        # try to logout before failing
+        self.logout()
+        module.fail_json(msg=msg, locked=True, saved=saved, unlocked=unlocked)
+
     def config_delete(self, module, name):
         """
         This method is used to handle the logic for Ansible modules when the "state" is set to "absent" and only the
@@ -454,21 +663,50 @@ class FortiManager(object):
 
         return {"method": "delete", "params": [{"url": self.obj_url + "/{}".format(name)}]}
 
-    def config_lock(self, module, msg="Unable to Lock the Configuration; Validate the ADOM is not Currently Locked."):
+    def config_lock(self, module, msg="Unable to Lock the Configuration; Validate the ADOM is not Currently Locked.",
+                    max_interval=30):
         """
         This method is used to handle the logic for Ansible modules for locking the ADOM when "lock" is set to True. The
-        lock method is used to make the request to the FortiManager.
+        lock method is used to make the request to the FortiManager. Unsuccessful attempts are retried until
+        lock_timeout seconds have passed, waiting a random time of up to an exponentially increasing interval between
+        attempts so parallel tasks do not retry in step. The number of seconds spent waiting is stored in lock_wait,
+        and the lock info of the ADOM is returned as lock_holder if the ADOM can not be locked. If the session is shared
+        through session_cache or the broker, a private session is logged in first, so other tasks using the shared
+        session do not write to the locked workspace or release the lock.
 
         :param module: The Ansible Module instance started by the task.
         :param msg: Type str.
                     A message for the module to return upon failure.
+        :param max_interval: Type int.
+                             The maximum number of seconds to wait between attempts.
         :return: True if lock successful.
         """
+        # the workspace lock belongs to the session, so a session shared with other tasks is replaced by a private one
+        if self.shared_session:
+            login = self.login(private=True)
+            if login.json()["result"][0]["status"]["code"] != 0:
+                module.fail_json(msg="Unable to Login with a Private Session to Lock the ADOM", locked=False,
+                                 saved=False, unlocked=False)
+
+        clock = getattr(time, "monotonic", time.time)
+        start = clock()
+        interval = 1
         lock_status = self.lock()
-        if lock_status["result"][0]["status"]["code"] != 0:
-            # try to logout before failing
-            self.logout()
-            module.fail_json(msg=msg, locked=False, saved=False, unlocked=False)
+        while lock_status["result"][0]["status"]["code"] != 0:
+            remaining = start + self.lock_timeout - clock()
+            if remaining <= 0:
+                self.lock_wait = round(clock() - start, 2)
+                lock_holder = self.get_lock_info()
+                # try to logout before failing
+                self.logout()
+                module.fail_json(msg=msg, locked=False, saved=False, unlocked=False, lock_wait=self.lock_wait,
+                                 lock_holder=lock_holder)
+
+            time.sleep(min(random.uniform(0, interval), remaining))
+            interval = min(interval * 2, max_interval)
+            lock_status = self.lock()
+
+        self.lock_wait = round(clock() - start, 2)
 
         return True
 
@@ -557,8 +795,8 @@ class FortiManager(object):
     def config_response(self, module, json_response, lock):
         """
         This method is to handle the logic for Ansible modules for handling the config request's response. If the lock
-        parameter is set to true and the config was successful, the config_save and config_unlock methods are used to
-        save the configuration and unlock the ADOM session. If the lock parameter is set to true and the config was
+        parameter is set to true and the config was successful, the config_commit method is used to save the
+        configuration and unlock the ADOM session. If the lock parameter is set to true and the config was
         unsuccessful, the config_unlock method is used to attempt to unlock the ADOM session before failing. If the lock
         parameter is set to False and the configuration is unsuccessful, the module will fail with the json response.
 
@@ -569,10 +807,9 @@ class FortiManager(object):
                      The setting of the configuration lock. True means locking mechanism is in place.
         :return: True if configuration was saved and the adom unlocked.
         """
-        # save if config successful and session locked
+        # save and unlock in a single request if config successful and session locked
         if json_response["result"][0]["status"]["code"] == 0 and lock:
-            self.config_save(module)
-            self.config_unlock(module)
+            self.config_commit(module)
         # attempt to unlock if config unsuccessful
         elif json_response["result"][0]["status"]["code"] != 0 and lock:
             self.config_unlock(module, msg=json_response, saved=False)
@@ -691,6 +928,19 @@ class FortiManager(object):
 
         return response
 
+    def delete_revisions(self, versions):
+        """
+        This method is used to delete several ADOM revisions from the FortiManager using batched requests, so the
+        result of each deletion is returned without retrieving the revisions again.
+
+        :param versions: Type list.
+                         The version numbers corresponding to the revisions to delete.
+        :return: A list of result dictionaries; the result at each index belongs to the version at the same index.
+        """
+        params = [{"url": "{}revision/{}".format(self.dvmdb_url, version)} for version in versions]
+
+        return self.make_batch_request("delete", params)
+
     def get_adom_fields(self, adom, fields=[]):
         """
         This method is used to get all adoms currently configured on the FortiManager. A list of fields can be passed
@@ -752,6 +1002,46 @@ class FortiManager(object):
 
         return response.json()["result"][0].get("data", [])
 
+    def get_all_paged(self, fields=[], page_size=1000):
+        """
+        This method is used to lazily iterate over all objects currently configured on the FortiManager for the ADOM and
+        API Endpoint, retrieving them one page at a time so that large tables are never held in a single response.
+
+        :param fields: Type list.
+                       The list of fields to return for each object; all fields are returned when empty.
+        :param page_size: Type int.
+                          The number of objects to retrieve per request.
+        :return: A generator yielding the configuration dictionary of each object.
+        """
+        return self.get_paged(self.obj_url, fields, page_size)
+
+    def get_cached_hash(self, name):
+        """
+        This method is used to get the hash of the configuration last applied to an object from the hash_cache file.
+
+        :param name: Type str.
+                     The name of the object.
+        :return: The hash as a str. None is returned if hash_cache is not set or the object has no cached hash.
+        """
+        if not self.hash_cache:
+            return None
+
+        return self.read_hash_cache().get("{}:{}{}/{}".format(self.host, self.port, self.obj_url, name))
+
+    def get_config_hash(self, config):
+        """
+        This method is used to get a hash of an object's configuration. The configuration is normalized first, so the
+        hash does not depend on key order, the order of lists that are appended to, or whether numbers are passed as
+        strings.
+
+        :param config: Type dict.
+                       The configuration to hash.
+        :return: The SHA-256 hex digest of the normalized configuration as a str.
+        """
+        normalized = json.dumps(self.normalize_config(config, self.replace_fields), sort_keys=True)
+
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
     def get_device_config(self, device, vdom, config_url, fields=[]):
         """
         This method is used to retrieve the static routes configured on the managed device.
@@ -776,6 +1066,46 @@ class FortiManager(object):
 
         return response
 
+    def get_device_config_paged(self, device, vdom, config_url, fields=[], page_size=1000):
+        """
+        This method is used to lazily retrieve a configuration section from a managed device one page at a time.
+
+        :param device: Type str.
+                       The device to retrieve the configuration from.
+        :param vdom: Type str.
+                     The vdom to retrieve the configuration from.
+        :param config_url: Type str.
+                           The url associated with the configuration section to retrieve.
+        :param fields: Type list.
+                       A list of fields to retrieve for each entry.
+        :param page_size: Type int.
+                          The number of entries to retrieve per request.
+        :return: A generator yielding each configuration entry of the section.
+        """
+        config_url = "/pm/config/device/{}/vdom/{}/{}".format(device, vdom, config_url)
+
+        return self.get_paged(config_url, fields, page_size)
+
+    def get_device_configs(self, sections, fields=[]):
+        """
+        This method is used to retrieve several configuration sections from managed devices using batched requests.
+
+        :param sections: Type list.
+                         A list of (device, vdom, config_url) tuples identifying each section to retrieve.
+        :param fields: Type list.
+                       A list of fields to retrieve for each section.
+        :return: A list with the configuration data of each section, in the same order as sections. An empty list is
+                 used for any section that does not return any data.
+        """
+        params = []
+        for device, vdom, config_url in sections:
+            config_url = "/pm/config/device/{}/vdom/{}/{}".format(device, vdom, config_url)
+            params.append(dict(url=config_url, fields=fields))
+
+        results = self.make_batch_request("get", params)
+
+        return [result.get("data") or [] for result in results]
+
     def get_device_fields(self, device, fields=[]):
         """
         This method is used to retrieve information about a managed device from FortiManager. A list of fields can be
@@ -870,8 +1200,8 @@ class FortiManager(object):
         for field in proposed.keys():
             if field in existing and proposed[field] != existing[field]:
                 if type(existing[field]) is list:
-                    diff = list(set(proposed[field]).union(existing[field]))
-                    if diff != existing[field]:
+                    diff, added = FortiManager.get_member_union(proposed[field], existing[field])
+                    if added:
                         config[field] = diff
                 elif type(existing[field]) is dict:
                     config[field] = dict(set(proposed[field].items()).union(existing[field].items()))
@@ -885,13 +1215,14 @@ class FortiManager(object):
 
         return config
 
-    @staticmethod
-    def get_diff_add_map(proposed, existing):
+    def get_diff_add_map(self, proposed, existing):
         """
         This method is used to get the difference between two dynamic_mapping configurations when the "proposed"
         configuration is a dict of configuration items that should exist in the configuration for the object in the
         FortiManager. Either the get_item or get_item_fields method should be used to obtain the "existing" variable; if
         either of those methods return an empty dict, then you should use the add_config method to add the new object.
+        The existing mappings are indexed by scope, so any number of proposed mappings and scopes are compared in a
+        single pass; the get_diff_add_mapping method is used to compare the fields of each mapping.
 
         :param proposed: Type dict.
                          The configuration that should exist for the object on the FortiManager.
@@ -900,57 +1231,75 @@ class FortiManager(object):
         :return: A dict corresponding to the "data" portion of an "update" request. This can be used to call the
                  update_config method.
         """
-        name = proposed.get("name")
-        proposed_map = proposed.get("dynamic_mapping")[0]
-        proposed_scope = proposed_map.pop("_scope")[0]
         existing_map = existing.get("dynamic_mapping", [])
-        config = dict(name=name, dynamic_mapping=[])
-        present = False
-
-        # check if mapping already exists and make necessary updates to config
-        for mapping in existing_map:
-            if proposed_scope in mapping["_scope"]:
-                present = True
-                updated_map = {}
-                for field in proposed_map.keys():
-                    # only consider relevant fields that have a difference
-                    if field in mapping and proposed_map[field] != mapping[field]:
-                        if type(mapping[field]) is list:
-                            diff = list(set(proposed_map[field]).union(mapping[field]))
-                            if diff != mapping[field]:
-                                updated_map[field] = diff
-                        elif type(mapping[field]) is dict:
-                            updated_map[field] = dict(set(proposed_map[field].items()).union(mapping[field].items()))
-                        elif type(mapping[field]) is str or type(mapping[field]) is unicode:
-                            updated_map[field] = proposed_map[field]
-                    elif field not in mapping:
-                        updated_map[field] = proposed_map[field]
-                # config update if dynamic_mapping dict has any keys, need to append _scope key
+        scopes = self.get_scope_index(existing_map)
+        updates = {}
+        new_maps = []
+
+        for proposed_map in proposed.get("dynamic_mapping", []):
+            fields = dict((k, v) for k, v in proposed_map.items() if k != "_scope")
+            new_scopes = []
+            for scope in proposed_map["_scope"]:
+                position = scopes.get((scope.get("name"), scope.get("vdom")))
+                if position is None:
+                    new_scopes.append(scope)
+                    continue
+
+                # compare against the mapping with any updates already found for one of its other scopes
+                mapping = dict(existing_map[position], **updates.get(position, {}))
+                updated_map = self.get_diff_add_mapping(fields, mapping)
                 if updated_map:
-                    # add scope to updated_map and append the config to the list of other mappings
-                    updated_map["_scope"] = mapping["_scope"]
-                    config["dynamic_mapping"].append(updated_map)
-                else:
-                    # set config to a null dictionary if dynamic mappings are identical and exit loop
-                    config = {}
-                    break
-            else:
-                # keep unrelated mapping in diff so that diff can be used to update FortiManager
-                config["dynamic_mapping"].append(dict(_scope=mapping["_scope"]))
+                    updates.setdefault(position, {}).update(updated_map)
 
-        # add mapping to config if it does not currently exist
-        if not present:
-            config = proposed
-            config["dynamic_mapping"][0]["_scope"] = [proposed_scope]
-            for mapping in existing_map:
-                config["dynamic_mapping"].append(dict(_scope=mapping["_scope"]))
+            if new_scopes:
+                new_maps.append(dict(fields, _scope=new_scopes))
+
+        if not updates and not new_maps:
+            return {}
+
+        # keep unrelated mappings in diff so that diff can be used to update FortiManager
+        mappings = [dict(updates.get(position, {}), _scope=mapping["_scope"])
+                    for position, mapping in enumerate(existing_map)]
+        if new_maps:
+            config = dict(proposed, dynamic_mapping=new_maps + mappings)
+        else:
+            config = dict(name=proposed.get("name"), dynamic_mapping=mappings)
 
         return config
 
     @staticmethod
-    def get_diff_mappings(proposed, existing):
-        """
-        This method is to get the diff of just the mapped Fortigate devices.
+    def get_diff_add_mapping(proposed_map, mapping):
+        """
+        This method is used to get the difference between the fields of a proposed dynamic_mapping and an existing
+        mapping for the same scope. Endpoints that replace lists instead of appending to them override this method.
+
+        :param proposed_map: Type dict.
+                             The mapping fields, without the "_scope" key, that should exist for the scope.
+        :param mapping: Type dict.
+                        The existing mapping for the scope.
+        :return: A dict of the mapping fields that need to be updated. An empty dict is returned if there is no change.
+        """
+        updated_map = {}
+        for field in proposed_map.keys():
+            # only consider relevant fields that have a difference
+            if field in mapping and proposed_map[field] != mapping[field]:
+                if type(mapping[field]) is list:
+                    diff, added = FortiManager.get_member_union(proposed_map[field], mapping[field])
+                    if added:
+                        updated_map[field] = diff
+                elif type(mapping[field]) is dict:
+                    updated_map[field] = dict(set(proposed_map[field].items()).union(mapping[field].items()))
+                elif type(mapping[field]) is str or type(mapping[field]) is unicode:
+                    updated_map[field] = proposed_map[field]
+            elif field not in mapping:
+                updated_map[field] = proposed_map[field]
+
+        return updated_map
+
+    def get_diff_mappings(self, proposed, existing):
+        """
+        This method is to get the diff of just the mapped Fortigate devices. Mappings are removed when every one of
+        their scopes is in the proposed mappings.
         :param proposed: Type dict.
                          The configuration that should not exist for the object on the FortiManager.
         :param existing: Type dict.
@@ -958,9 +1307,10 @@ class FortiManager(object):
         :return: A dict corresponding to the "data" portion of an "update" request. This can be used to call the
                  update_config method.
         """
+        proposed_scopes = self.get_scope_index(proposed["dynamic_mapping"])
         config = dict(name=proposed["name"], dynamic_mapping=[])
         for mapping in existing.get("dynamic_mapping", []):
-            if mapping["_scope"] != proposed["dynamic_mapping"][0]["_scope"]:
+            if not all((scope.get("name"), scope.get("vdom")) in proposed_scopes for scope in mapping["_scope"]):
                 config["dynamic_mapping"].append(dict(_scope=mapping["_scope"]))
 
         if len(config["dynamic_mapping"]) == len(existing.get("dynamic_mapping", [])):
@@ -986,8 +1336,8 @@ class FortiManager(object):
         config = {}
         for field in proposed.keys():
             if field in existing and type(existing[field]) is list:
-                diff = list(set(existing[field]).difference(proposed[field]))
-                if diff != existing[field]:
+                diff, removed = FortiManager.get_member_difference(existing[field], proposed[field])
+                if removed:
                     config[field] = diff
             elif field in existing and type(existing[field]) is dict:
                 diff = dict(set(proposed.items()).difference(existing.items()))
@@ -999,14 +1349,14 @@ class FortiManager(object):
 
         return config
 
-    @staticmethod
-    def get_diff_remove_map(proposed, existing):
+    def get_diff_remove_map(self, proposed, existing):
         """
         This method is used to get the difference between two dynamic_mapping configurations when the "proposed"
         configuration is a dict of configuration items that should not exist in the configuration for the object in the
         FortiManager. Either the get_item or get_item_fields method should be used to obtain the "existing" variable; if
         either of those methods return an empty dict, then the object does not exist and there is no configuration to
-        remove.
+        remove. The existing mappings are indexed by scope, so any number of proposed mappings and scopes are compared
+        in a single pass; the get_diff_remove_mapping method is used to compare the fields of each mapping.
 
         :param proposed: Type dict.
                          The configuration that should not exist for the object on the FortiManager.
@@ -1015,46 +1365,57 @@ class FortiManager(object):
         :return: A dict corresponding to the "data" portion of an "update" request. This can be used to call the
                  update_config method.
         """
-        name = proposed.get("name")
-        proposed_map = proposed.get("dynamic_mapping")[0]
-        proposed_scope = proposed_map.pop("_scope")[0]
         existing_map = existing.get("dynamic_mapping", [])
-        config = dict(name=name, dynamic_mapping=[])
-        present = False
-
-        # check if mapping already exists and make necessary updates to config
-        for mapping in existing_map:
-            if proposed_scope in mapping["_scope"]:
-                present = True
-                updated_map = {}
-                for field in proposed_map.keys():
-                    if field in mapping and type(mapping[field]) is list:
-                        diff = list(set(mapping[field]).difference(proposed_map[field]))
-                        if diff != mapping[field]:
-                            updated_map[field] = diff
-                    elif field in mapping and type(mapping[field]) is dict:
-                        diff = dict(set(proposed_map.items()).difference(mapping.items()))
-                        if diff != mapping[field]:
-                            updated_map[field] = diff
-
-                # config update if dynamic_mapping dict has any keys, need to append _scope key
+        scopes = self.get_scope_index(existing_map)
+        updates = {}
+
+        for proposed_map in proposed.get("dynamic_mapping", []):
+            fields = dict((k, v) for k, v in proposed_map.items() if k != "_scope")
+            for scope in proposed_map["_scope"]:
+                # scopes that are not mapped have no configuration to remove
+                position = scopes.get((scope.get("name"), scope.get("vdom")))
+                if position is None:
+                    continue
+
+                mapping = dict(existing_map[position], **updates.get(position, {}))
+                updated_map = self.get_diff_remove_mapping(fields, mapping)
                 if updated_map:
-                    # add scope to updated_map and append the config to the list of other mappings
-                    updated_map["_scope"] = mapping["_scope"]
-                    config["dynamic_mapping"].append(updated_map)
-                else:
-                    # remove dynamic mapping from proposed if proposed matches existing config
-                    config = {}
-                    break
-            else:
-                # keep unrelated mapping in diff so that diff can be used to update FortiManager
-                config["dynamic_mapping"].append(dict(_scope=mapping["_scope"]))
+                    updates.setdefault(position, {}).update(updated_map)
 
-        # set config to dict with name only if mapping does not exist representing no change
-        if not present:
-            config = {}
+        if not updates:
+            return {}
 
-        return config
+        # keep unrelated mappings in diff so that diff can be used to update FortiManager
+        mappings = [dict(updates.get(position, {}), _scope=mapping["_scope"])
+                    for position, mapping in enumerate(existing_map)]
+
+        return dict(name=proposed.get("name"), dynamic_mapping=mappings)
+
+    @staticmethod
+    def get_diff_remove_mapping(proposed_map, mapping):
+        """
+        This method is used to get the difference between the fields of a proposed dynamic_mapping and an existing
+        mapping for the same scope when the proposed fields should not exist. Endpoints with fields that can not be
+        removed override this method.
+
+        :param proposed_map: Type dict.
+                             The mapping fields, without the "_scope" key, that should not exist for the scope.
+        :param mapping: Type dict.
+                        The existing mapping for the scope.
+        :return: A dict of the mapping fields that need to be updated. An empty dict is returned if there is no change.
+        """
+        updated_map = {}
+        for field in proposed_map.keys():
+            if field in mapping and type(mapping[field]) is list:
+                diff, removed = FortiManager.get_member_difference(mapping[field], proposed_map[field])
+                if removed:
+                    updated_map[field] = diff
+            elif field in mapping and type(mapping[field]) is dict:
+                diff = dict(set(proposed_map.items()).difference(mapping.items()))
+                if diff != mapping[field]:
+                    updated_map[field] = diff
+
+        return updated_map
 
     def get_ha(self):
         """
@@ -1120,6 +1481,112 @@ class FortiManager(object):
         else:
             return {}
 
+    def get_items(self, names):
+        """
+        This method is used to get several objects currently configured on the FortiManager for the ADOM and API
+        Endpoint using batched requests.
+
+        :param names: Type list.
+                      The names of the objects to retrieve.
+        :return: A dictionary mapping each name to its configuration dictionary. An empty dict is used for any object
+                 that does not exist.
+        """
+        params = [{"url": self.obj_url + "/{}".format(name)} for name in names]
+        results = self.make_batch_request("get", params)
+
+        return dict((name, result.get("data", {})) for name, result in zip(names, results))
+
+    def get_lock_info(self):
+        """
+        This method is used to get the lock info of the ADOM's workspace, which includes the user and session holding
+        the lock.
+
+        :return: The lock info returned by the FortiManager. An empty list is returned if the request does not return
+                 any data.
+        """
+        body = {"method": "get", "params": [{"url": self.wsp_url + "lockinfo"}], "verbose": 1, "session": self.session}
+        response = self.make_request(body)
+
+        return response.json()["result"][0].get("data", [])
+
+    @staticmethod
+    def get_member_difference(existing, proposed):
+        """
+        This method is used to remove members from a list while preserving the order of the remaining members, so the
+        result only differs from the existing list when a member is actually removed.
+
+        :param existing: Type list.
+                         The members currently configured.
+        :param proposed: Type list.
+                         The members that should not exist.
+        :return: A tuple of the remaining members and the members that were removed, each in their existing order.
+        """
+        proposed = set(proposed)
+        members = []
+        removed = []
+        for member in existing:
+            if member in proposed:
+                removed.append(member)
+            else:
+                members.append(member)
+
+        return members, removed
+
+    @staticmethod
+    def get_member_union(proposed, existing):
+        """
+        This method is used to add members to a list while preserving the order of the existing members, so the result
+        only differs from the existing list when a member is actually added. New members are appended in the order they
+        are proposed.
+
+        :param proposed: Type list.
+                         The members that should exist.
+        :param existing: Type list.
+                         The members currently configured.
+        :return: A tuple of the combined members and the members that were added.
+        """
+        members = list(existing)
+        seen = set(existing)
+        added = []
+        for member in proposed:
+            if member not in seen:
+                seen.add(member)
+                added.append(member)
+
+        members.extend(added)
+
+        return members, added
+
+    def get_paged(self, url, fields=[], page_size=1000):
+        """
+        This method is used to lazily retrieve the entries of a table using the API's "range" parameter. A new request
+        is only made once the entries of the previous page have been consumed.
+
+        :param url: Type str.
+                    The url of the table to retrieve.
+        :param fields: Type list.
+                       The list of fields to return for each entry; all fields are returned when empty.
+        :param page_size: Type int.
+                          The number of entries to retrieve per request.
+        :return: A generator yielding each entry of the table.
+        """
+        offset = 0
+        while True:
+            params = [{"url": url, "range": [offset, page_size]}]
+            if fields:
+                params[0]["fields"] = fields
+
+            body = {"method": "get", "params": params, "verbose": 1, "session": self.session}
+            data = self.make_request(body).json()["result"][0].get("data") or []
+            for entry in data:
+                yield entry
+
+            # a short page is the last page; a page larger than requested means the range was not honored
+            if len(data) != page_size:
+                break
+
+            offset += page_size
+
     def get_revision(self, name=""):
         """
         This method is used to retrieve ADOM revisions from the FortiManager. If name is not specified, all revisions
@@ -1139,6 +1606,22 @@ class FortiManager(object):
 
         return response
 
+    @staticmethod
+    def get_scope_index(mappings):
+        """
+        This method is used to index dynamic_mapping entries by the FortiGate and VDOM of each of their scopes.
+
+        :param mappings: Type list.
+                         The dynamic_mapping entries to index.
+        :return: A dict mapping each (name, vdom) scope tuple to the position of its entry in mappings.
+        """
+        index = {}
+        for position, mapping in enumerate(mappings):
+            for scope in mapping.get("_scope", []):
+                index[(scope.get("name"), scope.get("vdom"))] = position
+
+        return index
+
     def get_status(self):
         """
         This method is used to retrieve the status of the FortiManager.
@@ -1152,7 +1635,7 @@ class FortiManager(object):
 
     def get_task(self, task, wait):
         """
-        This method is used to get the status of a task.
+        This method is used to get the status of a task. The wait_task method is used to poll the task.
 
         :param task: Type str.
                      The task id to retrieve
@@ -1160,38 +1643,20 @@ class FortiManager(object):
                      The number of minutes to wait before failing.
         :return: The json results from the task once completed, failed, or time ran out.
         """
-        body = {"method": "get", "params": [{"url": "task/task/{}".format(task)}], "verbose": 1,
-                "session": self.session}
-        percent_complete = 0
-        countdown = time.localtime().tm_min
-
-        while percent_complete != 100:
-            response = self.make_request(body).json()
-            if response["result"][0]["status"]["code"] == 0:
-                percent_complete = response["result"][0]["data"]["percent"]
-
-            # limit execution time to specified time in minutes
-            if time.localtime().tm_min - countdown > wait:
-                break
-            elif countdown in range((60 - wait), 61) and time.localtime().tm_min in range(wait):
-                break
-            else:
-                time.sleep(15)
+        response, waited = self.wait_task(task, wait * 60)
 
         return response
 
     def install_package(self, proposed):
         """
-        This method is used to install a package to the end devices.
+        This method is used to install a package to the end devices. The start_install method is used to issue the
+        install, and the method waits for the install task to complete.
 
         :param proposed: Type list.
                          The data portion of the API Request.
         :return: The json result data from the task associated with request to make install the package.
         """
-        body = {"method": "exec", "params": [{"url": "/securityconsole/install/package", "data": proposed, "id": 1,
-                                              "session": self.session}]}
-
-        response = self.make_request(body).json()
+        response = self.start_install(proposed)
 
         # collect task id
         if response["result"][0]["status"]["code"] == 0:
@@ -1200,10 +1665,32 @@ class FortiManager(object):
             return response
 
         # check for task completion
-        task_status = self.get_task(task, 10)
+        task_status, waited = self.wait_task(task, 600)
+        task_status["waited"] = waited
 
         return task_status
 
+    def join_lease(self, module):
+        """
+        This method is used to run a module within the workspace transaction started by fortimgr_lock with lease_file.
+        The transaction's session is used if session_id is not given, and the lock param is set to False, as the ADOM is
+        already locked by the transaction and is saved and unlocked by fortimgr_lock. The module fails if the
+        transaction was abandoned, as the ADOM was unlocked without saving the transaction's earlier writes.
+
+        :param module: The Ansible Module instance started by the task.
+        :return: The session_id param, or the transaction's session if session_id is not given. None is returned if
+                 neither is available, and the module should login.
+        """
+        session_id = module.params["session_id"]
+        lease = self.read_lease() if self.lease_file else {}
+        if lease.get("error"):
+            module.fail_json(msg=lease["error"], locked=False, saved=False, unlocked=False)
+        elif lease:
+            module.params["lock"] = False
+            session_id = session_id or lease.get("session")
+
+        return session_id
+
     def lock(self):
         """
         The lock method is used to lock the ADOM to enable configurations to be sent to the FortiManager when it has
@@ -1216,48 +1703,247 @@ class FortiManager(object):
 
         return response.json()
 
-    def login(self):
+    def login(self, private=False):
         """
         The login method is used to establish a session with the FortiManager. All necessary parameters need to be
-        established at class instantiation.
+        established at class instantiation. If session_cache is set, the login_cached method is used instead.
 
+        :param private: Type bool.
+                        Logs in with a new session that is not shared through session_cache or the broker.
         :return: The response from the login request. The instance session is also set, and defaults to None if the
         login was not successful
         """
+        if self.session_cache and not private:
+            return self.login_cached()
+
         params = [{"url": "/sys/login/user", "data": {"user": self.user, "passwd": self.passw}}]
         body = {"method": "exec", "params": params}
-        login = self.make_request(body)
+        if private:
+            # the broker returns the session it shares between clients, so a private session is logged in directly
+            login = self.http_session.post(self.url, json=body, timeout=self.timeout)
+            self.shared_session = False
+        else:
+            login = self.make_request(body)
+            self.shared_session = self.brokered
 
         self.session = login.json().get("session")
 
         return login
 
+    def login_cached(self):
+        """
+        The login_cached method is used to reuse a session stored in the session_cache file by a previous module run.
+        The cached session is validated with an inexpensive status request, and a new login is only made if there is no
+        cached session, the session is no longer valid, or the session is older than session_cache_ttl; sessions older
+        than session_cache_ttl are logged out. The cache file is locked while in use so that concurrent module runs
+        share a single session.
+
+        :return: The response from the status request if the cached session is valid, otherwise the response from the
+                 login request. The instance session is also set, and defaults to None if the login was not successful.
+        """
+        with open(self.session_cache + ".lock", "a") as cache_lock:
+            fcntl.flock(cache_lock, fcntl.LOCK_EX)
+            try:
+                sessions = self.read_session_cache()
+                cached = sessions.get(self.session_cache_key)
+                if cached:
+                    self.session = cached["session"]
+                    if time.time() - cached["created"] < self.session_cache_ttl:
+                        body = dict(method="get", params=[dict(url="/sys/status")], session=self.session)
+                        status = self.make_request(body)
+                        if status.json()["result"][0]["status"]["code"] == 0:
+                            self.shared_session = True
+                            return status
+                    else:
+                        # retire sessions that have outlived the ttl
+                        self.make_request(dict(method="exec", params=[{"url": "/sys/logout"}], session=self.session))
+
+                params = [{"url": "/sys/login/user", "data": {"user": self.user, "passwd": self.passw}}]
+                body = {"method": "exec", "params": params}
+                login = self.make_request(body)
+                self.session = login.json().get("session")
+
+                if self.session:
+                    sessions[self.session_cache_key] = dict(session=self.session, created=time.time())
+                    self.shared_session = True
+                else:
+                    sessions.pop(self.session_cache_key, None)
+                self.write_session_cache(sessions)
+            finally:
+                fcntl.flock(cache_lock, fcntl.LOCK_UN)
+
+        return login
+
     def logout(self):
         """
         The login method is used to establish a session with the FortiManager. All necessary parameters need to be
-        established at class instantiation.
+        established at class instantiation. Sessions shared through session_cache are left active for later module runs;
+        the logout_cached method is used to end them.
 
         :return: The response from the login request. The instance session is also set, and defaults to None if the
         login was not successful
         """
+        if self.shared_session:
+            self.http_session.close()
+            return None
+
         body = dict(method="exec", params=[{"url": "/sys/logout"}], session=self.session)
         logout = self.make_request(body)
+        self.http_session.close()
 
         return logout
 
+    def logout_cached(self):
+        """
+        The logout_cached method is used to end the session stored in the session_cache file for the host and user, such
+        as at the end of a play. The session is removed from the cache before it is logged out, so later module runs
+        login again instead of reusing it.
+
+        :return: The response from the logout request, or None if no session is cached.
+        """
+        with open(self.session_cache + ".lock", "a") as cache_lock:
+            fcntl.flock(cache_lock, fcntl.LOCK_EX)
+            try:
+                sessions = self.read_session_cache()
+                cached = sessions.pop(self.session_cache_key, None)
+                if cached:
+                    self.write_session_cache(sessions)
+            finally:
+                fcntl.flock(cache_lock, fcntl.LOCK_UN)
+
+        logout = None
+        if cached:
+            body = dict(method="exec", params=[{"url": "/sys/logout"}], session=cached["session"])
+            logout = self.make_request(body)
+        self.http_session.close()
+
+        return logout
+
+    def make_batch_request(self, method, params, batch_size=100):
+        """
+        This method is used to send several API requests that share the same method in a single POST by placing each
+        request in the "params" list of the request body. Requests are split into chunks of batch_size to keep
+        individual responses at a manageable size.
+
+        :param method: Type str.
+                       The API method shared by every request (get, add, set, update, delete, exec).
+        :param params: Type list.
+                       A list of dictionaries, each one being the "params" entry of an individual request.
+        :param batch_size: Type int.
+                           The maximum number of params sent in a single POST.
+        :return: A list of result dictionaries; the result at each index belongs to the params entry at the same index.
+                 If the FortiManager does not return a result for every params entry, such as for an invalid session,
+                 every entry of the chunk is given a failed result so it can not be mistaken for a success.
+        """
+        results = []
+        for index in range(0, len(params), batch_size):
+            chunk = params[index:index + batch_size]
+            body = {"method": method, "params": chunk, "verbose": 1, "session": self.session}
+            response = self.make_request(body).json()
+            chunk_results = response.get("result") or []
+
+            # expand a single top-level error to every entry so callers pairing params and results see each failure
+            if len(chunk_results) != len(chunk):
+                failed = [result["status"] for result in chunk_results if result.get("status", {}).get("code") != 0]
+                status = failed[0] if failed else {"code": -1, "message": "Missing Result for Batched Request"}
+                chunk_results = [{"status": status, "url": param.get("url")} for param in chunk]
+
+            results.extend(chunk_results)
+
+        return results
+
+    def make_broker_request(self, body):
+        """
+        This method is used to forward a request to the FortiManager API through a fortimgr_broker. The request and the
+        broker's reply are each sent as a single line of JSON.
+
+        :param body: Type dict.
+                     The JSON body with the necessary request params.
+        :return: The response from the API request, or None if the broker is not running or closed the connection
+                 without a reply, so the request can be sent directly.
+        """
+        request = dict(url=self.url, verify=self.verify, timeout=self.timeout, body=body)
+        broker = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            broker.connect(self.broker_socket)
+            broker.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            reply = broker.makefile("rb").readline()
+        except socket.error:
+            reply = None
+        finally:
+            broker.close()
+
+        if not reply:
+            return None
+
+        reply = json.loads(reply.decode("utf-8"))
+        if "error" in reply:
+            raise requests.exceptions.ConnectionError(reply["error"])
+
+        response = requests.models.Response()
+        response.status_code = reply["status_code"]
+        response._content = reply["content"].encode("utf-8")
+
+        return response
+
     def make_request(self, body):
         """
         This method is used to make a request to the FortiManager API. All requests to FortiManager use the POST method
-        to the same URL.
+        to the same URL. Requests are sent over the instance's pooled keep-alive connections, so consecutive calls
+        reuse the established TCP and TLS session instead of performing a new handshake. If broker_socket is set, the
+        request is forwarded through the broker instead, and is sent directly if the broker can not be reached.
 
         :param body: Type dict.
                      The JSON body with the necessary request params.
         :return: The response from the API request.
         """
-        response = requests.post(self.url, json=body, headers=self.headers, verify=self.verify)
+        response = None
+        if self.broker_socket:
+            response = self.make_broker_request(body)
+        self.brokered = response is not None
+
+        if response is None:
+            response = self.http_session.post(self.url, json=body, timeout=self.timeout)
+
+        # count the successful writes made within a workspace transaction
+        if self.lease_file and body.get("method") in ["add", "clone", "delete", "move", "set", "update"]:
+            try:
+                results = response.json().get("result") or []
+            except ValueError:
+                results = []
+            writes = len([result for result in results if result.get("status", {}).get("code") == 0])
+            if writes:
+                self.update_lease(writes=writes)
 
         return response
 
+    @staticmethod
+    def normalize_config(config, replace=[]):
+        """
+        This method is used to convert a configuration to a canonical form used for hashing. Scalars are converted to
+        strings, and lists are sorted unless the field is in replace, as those lists are applied in the order given.
+
+        :param config: Type dict, list, or scalar.
+                       The configuration to normalize.
+        :param replace: Type list.
+                        The list fields whose order is significant.
+        :return: The normalized configuration.
+        """
+        if type(config) is dict:
+            normalized = {}
+            for field, value in config.items():
+                value = FortiManager.normalize_config(value, replace)
+                if type(value) is list and field not in replace:
+                    value = sorted(value, key=lambda entry: json.dumps(entry, sort_keys=True))
+                normalized[field] = value
+            return normalized
+        elif type(config) is list:
+            return [FortiManager.normalize_config(entry, replace) for entry in config]
+        elif type(config) is bool or config is None:
+            return config
+        else:
+            return u"{}".format(config)
+
     def preview_install(self, package, device, vdoms, lock):
         """
         This method is used to preview what changes will be pushed to the end device when the package is installed. The
@@ -1302,7 +1988,7 @@ class FortiManager(object):
         else:
             return response
 
-        task_status = self.get_task(task, 5)
+        task_status, waited = self.wait_task(task, 300)
         if task_status["result"][0]["data"]["percent"] == 100:
             # cancel install task
             url = "/securityconsole/package/cancel/install"
@@ -1324,6 +2010,67 @@ class FortiManager(object):
 
         return response
 
+    def read_hash_cache(self):
+        """
+        This method is used to read the configuration hashes stored in the hash_cache file.
+
+        :return: A dictionary of hashes keyed by FortiManager and object url. An empty dict is returned if the file does
+                 not exist or cannot be read.
+        """
+        try:
+            with open(self.hash_cache) as cache:
+                return json.load(cache)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def read_lease(self):
+        """
+        This method is used to read the workspace transaction stored in the lease_file.
+
+        :return: A dictionary of the transaction's adom, session, timings, renewals, and writes. An empty dict is
+                 returned if the file does not exist or cannot be read.
+        """
+        try:
+            with open(self.lease_file) as lease:
+                return json.load(lease)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def read_session_cache(self):
+        """
+        This method is used to read the sessions stored in the session_cache file.
+
+        :return: A dictionary of cached sessions keyed by host, port, and user. An empty dict is returned if the file
+                 does not exist or cannot be read.
+        """
+        try:
+            with open(self.session_cache) as cache:
+                return json.load(cache)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def record_hash(self, name, config_hash, committed):
+        """
+        This method is used to record the hash of the configuration applied to an object in the hash_cache file once
+        the configuration is committed, as a change that is later discarded would otherwise be skipped by later tasks.
+        Until then the object's cached hash is removed. Within a workspace transaction started with lease_file, the hash
+        is kept as pending in the lease file, and fortimgr_lock records it when the transaction is saved.
+
+        :param name: Type str.
+                     The name of the object.
+        :param config_hash: Type str.
+                            The hash of the configuration applied to the object. None removes the object's cached hash.
+        :param committed: Type bool.
+                          Whether the configuration is committed, either by saving the change or because nothing was
+                          changed.
+        """
+        if not self.hash_cache:
+            return
+
+        key = "{}:{}{}/{}".format(self.host, self.port, self.obj_url, name)
+        pending = self.lease_file and self.update_lease(hashes={key: config_hash})
+        self.set_cached_hashes({key: config_hash if committed and not pending else None})
+
     def restore_revision(self, version, proposed):
         """
         This method is used to restore an ADOM to a previous revision.
@@ -1351,6 +2098,56 @@ class FortiManager(object):
 
         return response.json()
 
+    def save_unlock(self):
+        """
+        The save_unlock method is used to save the ADOM configurations and unlock the ADOM using a single request. The
+        FortiManager runs the params of the request in order, and runs the unlock even if the save fails. The request is
+        sent using make_batch_request, so a single top-level error, such as for an invalid session, is returned as the
+        result of both steps.
+
+        :return: A dict with the "result" of each step; the first result is from the save and the second from the
+                 unlock.
+        """
+        params = [{"url": self.wsp_url + "commit"}, {"url": self.wsp_url + "unlock"}]
+
+        return {"result": self.make_batch_request("exec", params)}
+
+    def set_cached_hashes(self, updates):
+        """
+        This method is used to store the hashes of the configuration applied to objects in the hash_cache file. The
+        cache file is locked while it is updated so that concurrent module runs do not overwrite each other's hashes.
+
+        :param updates: Type dict.
+                        The hash of each object keyed by its cache key. A hash of None removes the object's cached hash.
+        """
+        with open(self.hash_cache + ".lock", "a") as cache_lock:
+            fcntl.flock(cache_lock, fcntl.LOCK_EX)
+            try:
+                hashes = self.read_hash_cache()
+                for key, config_hash in updates.items():
+                    if config_hash:
+                        hashes[key] = config_hash
+                    else:
+                        hashes.pop(key, None)
+                self.write_hash_cache(hashes)
+            finally:
+                fcntl.flock(cache_lock, fcntl.LOCK_UN)
+
+    def start_install(self, proposed):
+        """
+        This method is used to issue a package install to the end devices without waiting for it to complete. The
+        get_task or wait_task methods can be used to track the task id returned in the response.
+
+        :param proposed: Type list.
+                         The data portion of the API Request.
+        :return: The json response data from the request to install the package.
+        """
+        body = {"method": "exec", "params": [{"url": "/securityconsole/install/package", "data": proposed, "id": 1,
+                                              "session": self.session}]}
+        response = self.make_request(body).json()
+
+        return response
+
     def unlock(self):
         """
         The unlock method is used to lock the ADOM to enable configurations to be sent to the FortiManager when it has
@@ -1363,6 +2160,44 @@ class FortiManager(object):
 
         return response.json()
 
+    def update_lease(self, writes=0, renewals=0, hashes=None, **fields):
+        """
+        This method is used to update the workspace transaction stored in the lease_file. The lease file is locked while
+        it is updated so that concurrent module runs and the keepalive process do not overwrite each other's updates.
+        Nothing is written if the lease file does not exist, as the transaction has ended, and the lock file is not
+        created, so no file is left behind once the transaction's files are removed by end_lease.
+
+        :param writes: Type int.
+                       The number of writes to add to the transaction's writes and pending_writes counters.
+        :param renewals: Type int.
+                         The number of renewals to add to the transaction's renewals counter.
+        :param hashes: Type dict.
+                       The configuration hashes to record in the instance's hash_cache when the transaction is saved,
+                       keyed by their cache key.
+        :param fields: Type dict.
+                       Fields of the transaction to set, such as pending_writes=0 after a save.
+        :return: The updated transaction, or an empty dict if the lease file does not exist.
+        """
+        if not os.path.exists(self.lease_file):
+            return {}
+
+        with open(self.lease_file + ".lock", "a") as lease_lock:
+            fcntl.flock(lease_lock, fcntl.LOCK_EX)
+            try:
+                lease = self.read_lease()
+                if lease:
+                    lease["writes"] = lease.get("writes", 0) + writes
+                    lease["pending_writes"] = lease.get("pending_writes", 0) + writes
+                    lease["renewals"] = lease.get("renewals", 0) + renewals
+                    if hashes:
+                        lease.setdefault("pending_hashes", {}).setdefault(self.hash_cache, {}).update(hashes)
+                    lease.update(fields)
+                    self.write_lease(lease)
+            finally:
+                fcntl.flock(lease_lock, fcntl.LOCK_UN)
+
+        return lease
+
     def update_config(self, update_config):
         """
         This method is used to submit a configuration update request to the FortiManager. Only the object configuration
@@ -1385,6 +2220,90 @@ class FortiManager(object):
 
         return response
 
+    def wait_task(self, task, timeout, callback=None, interval=1, max_interval=15):
+        """
+        This method is used to wait for a task to complete. The task is polled quickly at first and the delay between
+        polls doubles up to max_interval, so short tasks return within seconds while long tasks are not polled
+        excessively. Time is measured with a monotonic clock so the deadline is not affected by wall clock changes.
+
+        :param task: Type str.
+                     The task id to wait for.
+        :param timeout: Type int.
+                        The number of seconds to wait for the task before returning.
+        :param callback: Type function.
+                         A function called with the task data after each successful poll, used to report progress.
+        :param interval: Type int.
+                         The number of seconds to wait after the first poll.
+        :param max_interval: Type int.
+                             The maximum number of seconds to wait between polls.
+        :return: A tuple of the json results from the task once completed, failed, or time ran out, and the number of
+                 seconds spent waiting.
+        """
+        clock = getattr(time, "monotonic", time.time)
+        body = {"method": "get", "params": [{"url": "task/task/{}".format(task)}], "verbose": 1,
+                "session": self.session}
+        start = clock()
+        deadline = start + timeout
+        delay = interval
+
+        while True:
+            response = self.make_request(body).json()
+            if response["result"][0]["status"]["code"] == 0:
+                if callback:
+                    callback(response["result"][0]["data"])
+                if response["result"][0]["data"]["percent"] == 100:
+                    break
+
+            # limit execution time to the deadline
+            remaining = deadline - clock()
+            if remaining <= 0:
+                break
+
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_interval)
+
+        return response, clock() - start
+
+    def write_hash_cache(self, hashes):
+        """
+        This method is used to write the configuration hashes to the hash_cache file. The file is replaced atomically so
+        that other module runs never read a partial file.
+
+        :param hashes: Type dict.
+                       The configuration hashes keyed by FortiManager and object url.
+        """
+        temp_file = "{}.{}".format(self.hash_cache, os.getpid())
+        with os.fdopen(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as cache:
+            json.dump(hashes, cache)
+        os.rename(temp_file, self.hash_cache)
+
+    def write_lease(self, lease):
+        """
+        This method is used to write a workspace transaction to the lease_file. The file is only readable by its owner,
+        as it holds the session of the transaction, and is replaced atomically so that other module runs never read a
+        partial file.
+
+        :param lease: Type dict.
+                      The transaction to write.
+        """
+        temp_file = "{}.{}".format(self.lease_file, os.getpid())
+        with os.fdopen(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as lease_file:
+            json.dump(lease, lease_file)
+        os.rename(temp_file, self.lease_file)
+
+    def write_session_cache(self, sessions):
+        """
+        This method is used to write the sessions to the session_cache file. The file is only readable by its owner and
+        is replaced atomically so that other module runs never read a partial file.
+
+        :param sessions: Type dict.
+                         The cached sessions keyed by host, port, and user.
+        """
+        temp_file = "{}.{}".format(self.session_cache, os.getpid())
+        with os.fdopen(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as cache:
+            json.dump(sessions, cache)
+        os.rename(temp_file, self.session_cache)
+
 
 class FMPolicy(FortiManager):
     """
@@ -1395,6 +2314,7 @@ class FMPolicy(FortiManager):
     def __init__(self, host, user, passw, use_ssl=True, verify=False, adom="", package="", api_endpoint="policy",
                  **kwargs):
         super(FMPolicy, self).__init__(host, user, passw, use_ssl, verify, adom, package, api_endpoint, **kwargs)
+        self.policy_index = None
 
     def add_config(self, new_config):
         """
@@ -1451,6 +2371,8 @@ class FMPolicy(FortiManager):
         if not module.check_mode:
             response = self.delete_config(policy_id)
             self.config_response(module, response.json(), module.params["lock"])
+            if self.policy_index is not None:
+                self.policy_index.remove(policy_id)
 
         return {"method": "delete", "params": [{"url": self.pkg_url + "/{}".format(policy_id)}]}
 
@@ -1471,24 +2393,21 @@ class FMPolicy(FortiManager):
         if module.params["direction"]:
             if module.params["session_id"]:
                 self.save()
-            global_label = self.get_item_fields(policy_id, ["global-label"]).get("global-label", "")
+            index = self.get_policy_index()
+            global_label = index.get(policy_id).get("global-label", "")
 
             direction = module.params["direction"]
             if module.params["reference_policy_name"]:
-                reference_id = str(self.get_item_name(module.params["reference_policy_name"]))
+                reference_id = str(index.get_id(module.params["reference_policy_name"]))
             else:
                 reference_id = module.params["reference_policy_id"]
 
-            proposed_reference = self.get_item_fields(policy_id, ["policyid"])
-            existing_reference = self.get_item_fields(int(reference_id), ["policyid"])
-            if not proposed_reference or not existing_reference:
+            proposed_position = index.get_position(policy_id)
+            existing_position = index.get_position(int(reference_id))
+            if proposed_position is None or existing_position is None:
                 results["msg"] = "Unable to Find the Policies; Please Verify the Policy Params."
                 module.fail_json(**results)
 
-            all_existing = self.get_all_fields(["policyid"])
-            proposed_position = all_existing.index(proposed_reference)
-            existing_position = all_existing.index(existing_reference)
-
             # check if policy is currently in the correct position for idempotency
             if proposed_position - existing_position == 0:
                 return {}
@@ -1506,6 +2425,8 @@ class FMPolicy(FortiManager):
             # configure if not in check mode
             if not module.check_mode:
                 response = self.move_config(policy_id, direction, reference_id)
+                if response.json()["result"][0]["status"]["code"] == 0:
+                    index.move(policy_id, direction, int(reference_id))
                 if module.params["session_id"]:
                     self.save()
 
@@ -1517,41 +2438,40 @@ class FMPolicy(FortiManager):
                         self.save()
 
                 if response.json()["result"][0]["status"]["code"] == 0 and module.params["lock"]:
-                    save_status = self.save()
-                    if save_status["result"][0]["status"]["code"] == 0:
-                        unlock_status = self.unlock()
-                        # fail of unlock is unsuccessful
-                        if unlock_status["result"][0]["status"]["code"] != 0:
-                            results.append(dict(locked=True, saved=True, unlock=False, moved=move,
+                    # save and unlock in a single request; the unlock is run even if the save fails
+                    save_status, unlock_status = self.save_unlock()["result"]
+                    if save_status["status"]["code"] == 0:
+                        # fail if unlock is unsuccessful
+                        if unlock_status["status"]["code"] != 0:
+                            results.update(dict(locked=True, saved=True, unlocked=False, moved=move,
                                                 msg="Config Updated and Saved, but Unable to Unlock"))
                             module.fail_json(**results)
                     else:
-                        # attempt to unlock before failing for unsuccessful save
-                        unlock_status = self.unlock()
-                        if unlock_status["result"][0]["status"]["code"] != 0:
-                            # fail with save unsuccessful but unlock successful
-                            results.append(dict(locked=True, saved=False, unlocked=False,
+                        # the unlock was attempted before failing for unsuccessful save
+                        if unlock_status["status"]["code"] != 0:
+                            # fail with save and unlock unsuccessful
+                            results.update(dict(locked=True, saved=False, unlocked=False, moved=move,
                                                 msg="Config Updated, but Unable to Save or Unlock"))
                             module.fail_json(**results)
                         else:
-                            # fail with save and unlock unsuccessful
-                            results.append(dict(locked=True, saved=False, unlocked=True,
+                            # fail with save unsuccessful but unlock successful
+                            results.update(dict(locked=True, saved=False, unlocked=True, moved=move,
                                                 msg="Config Updated, Unable to Save, but Unlocked"))
                             module.fail_json(**results)
                 # do not attempt to save if unsuccessful move, but try to unlock before failing
                 elif response.json()["result"][0]["status"]["code"] != 0 and module.params["lock"]:
                     unlock_status = self.unlock()
                     if unlock_status["result"][0]["status"]["code"] == 0:
-                        results.append(dict(locked=True, saved=False, unlocked=True,
+                        results.update(dict(locked=True, saved=False, unlocked=True,
                                             msg="Policy Move Failed, Did not Save, but Unlocked"))
                         module.fail_json(**results)
                     else:
-                        results.append(dict(locked=True, saved=False, unlocked=False,
+                        results.update(dict(locked=True, saved=False, unlocked=False,
                                             msg="Policy Move Failed, Did not Save and Unable to Unlock"))
                         module.fail_json(**results)
                 # fail module when move unsuccessful and not in lock mode
                 elif response.json()["result"][0]["status"]["code"] != 0:
-                    results.append({"msg": response.json()})
+                    results.update(dict(msg=response.json()))
                     module.fail_json(**results)
 
             return move
@@ -1559,6 +2479,79 @@ class FMPolicy(FortiManager):
         else:
             return {}
 
+    def config_order(self, module, order):
+        """
+        This method is used to handle the logic for the Ansible module for ordering the policies in a package. The
+        policies listed in order are placed in the same relative order using the fewest possible moves, and all moves
+        are sent in a single batched request. The global-label of each policy is read once before the moves, and any
+        global-label lost while moving is re-applied with a single update once all moves are done.
+
+        :param module: The Ansible Module instance started by the task.
+        :param order: Type list.
+                      The policy IDs or names in the order they should appear in the package.
+        :return: A list of dictionaries that correspond to the moves that were sent in the request body to the
+                 FortiManager API. This list will map to the "moved" key returned by the Ansible Module.
+        """
+        index = self.get_policy_index()
+
+        desired = []
+        for policy in order:
+            policy = str(policy)
+            if policy.isdigit() and index.get_position(int(policy)) is not None:
+                desired.append(int(policy))
+            elif index.get_id(policy):
+                desired.append(index.get_id(policy))
+            else:
+                msg = "Unable to Find the Policy {}; Please Verify the policy_order Param.".format(policy)
+                module.fail_json(msg=msg)
+
+        if len(set(desired)) != len(desired):
+            module.fail_json(msg="A Policy is Listed More than Once in the policy_order Param.")
+
+        moves = self.get_order_moves(list(index.order), desired)
+        params = [{"url": self.pkg_url + "/{}".format(policy_id), "option": direction, "target": str(target)}
+                  for policy_id, direction, target in moves]
+        if not params:
+            return []
+
+        # lock config if set and module not in check mode
+        if module.params["lock"] and not module.check_mode:
+            self.config_lock(module)
+
+        # configure if not in check mode
+        if not module.check_mode:
+            failed = []
+            results = self.make_batch_request("move", params)
+            for move, result in zip(moves, results):
+                if result["status"]["code"] != 0:
+                    failed.append(dict(policyid=move[0], option=move[1], target=move[2], status=result["status"]))
+
+            # re-apply global labels lost on move
+            if not failed:
+                moved = set(move[0] for move in moves)
+                labels = dict((policy_id, index.get(policy_id).get("global-label", "")) for policy_id in moved)
+                lost = [{"policyid": policy["policyid"], "global-label": labels[policy["policyid"]]}
+                        for policy in self.get_all_paged(["policyid", "global-label"])
+                        if policy["policyid"] in moved and policy.get("global-label", "") != labels[policy["policyid"]]]
+                for policy_id, direction, target in moves:
+                    index.move(policy_id, direction, target)
+                if lost:
+                    response = self.update_config(lost).json()
+                    if response["result"][0]["status"]["code"] != 0:
+                        failed.append(dict(global_label=lost, status=response["result"][0]["status"]))
+
+            # attempt to unlock without saving if any move was unsuccessful
+            if failed and module.params["lock"]:
+                self.config_unlock(module, msg=failed, saved=False)
+                module.fail_json(msg="Unable to Apply all Moves", failed=failed, locked=True, saved=False,
+                                 unlocked=True)
+            elif failed:
+                module.fail_json(msg="Unable to Apply all Moves", failed=failed)
+            elif module.params["lock"]:
+                self.config_commit(module)
+
+        return [{"method": "move", "params": [param]} for param in params]
+
     def config_new(self, module, new_config):
         """
         This method is used to handle the logic for Ansible modules when the "state" is set to "present" and their is
@@ -1661,6 +2654,19 @@ class FMPolicy(FortiManager):
 
         return response.json()["result"][0].get("data", [])
 
+    def get_all_paged(self, fields=[], page_size=1000):
+        """
+        This method is used to lazily iterate over all policies in the package, retrieving them one page at a time so
+        that large policy tables are never held in a single response.
+
+        :param fields: Type list.
+                       The list of fields to return for each policy; all fields are returned when empty.
+        :param page_size: Type int.
+                          The number of policies to retrieve per request.
+        :return: A generator yielding the configuration dictionary of each policy.
+        """
+        return self.get_paged(self.pkg_url, fields, page_size)
+
     @staticmethod
     def get_diff_add(proposed, existing):
         """
@@ -1688,8 +2694,8 @@ class FMPolicy(FortiManager):
                 elif field in ignore:
                     pass
                 elif type(existing[field]) is list:
-                    diff = list(set(proposed[field]).union(existing[field]))
-                    if diff != existing[field]:
+                    diff, added = FortiManager.get_member_union(proposed[field], existing[field])
+                    if added:
                         config[field] = diff
                 elif type(existing[field]) is dict:
                     config[field] = dict(set(proposed[field].items()).union(existing[field].items()))
@@ -1731,8 +2737,8 @@ class FMPolicy(FortiManager):
             if field in ignore:
                 pass
             elif field in existing and type(existing[field]) is list:
-                diff = list(set(existing[field]).difference(proposed[field]))
-                if diff != existing[field]:
+                diff, removed = FortiManager.get_member_difference(existing[field], proposed[field])
+                if removed:
                     config[field] = diff
             elif field in existing and type(existing[field]) is dict:
                 diff = dict(set(proposed.items()).difference(existing.items()))
@@ -1793,6 +2799,9 @@ class FMPolicy(FortiManager):
         :return: The policy ID for the policy as an int. 0 is returned if a policy with the same name does not
                  currently existing.
         """
+        if self.policy_index is not None:
+            return self.policy_index.get_id(name)
+
         body = {"method": "get", "params": [{"url": self.pkg_url, "filter": ["name", "==", name]}],
                 "verbose": 1, "session": self.session}
 
@@ -1804,6 +2813,71 @@ class FMPolicy(FortiManager):
         else:
             return 0
 
+    @staticmethod
+    def get_order_moves(current, desired):
+        """
+        This method is used to find the fewest moves that place the policies in desired in the same relative order
+        within current. The policies already in the correct relative order form the longest increasing subsequence of
+        their desired positions, so only the remaining policies are moved, each after the policy preceding it in desired
+        (or before the first unmoved policy when it is the first policy in desired).
+
+        :param current: Type list.
+                        The policy IDs in the order they currently appear in the package.
+        :param desired: Type list.
+                        The policy IDs in the order they should appear in the package.
+        :return: A list of (policy_id, direction, target) tuples in the order the moves must be applied.
+        """
+        positions = dict((policy, index) for index, policy in enumerate(desired))
+        sequence = [positions[policy] for policy in current if policy in positions]
+
+        # patience sort keeping the index of the smallest tail of each length and each entry's predecessor
+        tails = []
+        tail_values = []
+        previous = [None] * len(sequence)
+        for index, value in enumerate(sequence):
+            length = bisect.bisect_left(tail_values, value)
+            if length:
+                previous[index] = tails[length - 1]
+            if length == len(tails):
+                tails.append(index)
+                tail_values.append(value)
+            else:
+                tails[length] = index
+                tail_values[length] = value
+
+        keep = set()
+        index = tails[-1] if tails else None
+        while index is not None:
+            keep.add(desired[sequence[index]])
+            index = previous[index]
+
+        moves = []
+        for index, policy in enumerate(desired):
+            if policy in keep:
+                continue
+            elif index:
+                moves.append((policy, "after", desired[index - 1]))
+            else:
+                anchor = [kept for kept in desired if kept in keep][0]
+                moves.append((policy, "before", anchor))
+
+        return moves
+
+    def get_policy_index(self, refresh=False):
+        """
+        This method is used to get the PolicyIndex for the package, building it with a single request for the policyid,
+        name, and global-label of every policy the first time it is needed. The index is kept in sync as policies are
+        added, updated, moved, and deleted by this instance, so it is only rebuilt when refresh is True.
+
+        :param refresh: Type bool.
+                        True rebuilds the index from the FortiManager.
+        :return: The PolicyIndex for the package.
+        """
+        if self.policy_index is None or refresh:
+            self.policy_index = PolicyIndex(self.get_all_paged(["policyid", "name", "global-label"]))
+
+        return self.policy_index
+
     def move_config(self, policy_id, direction, target):
         """
         This method is used to move a policy either before or after the target.
@@ -1847,16 +2921,143 @@ class FMPolicy(FortiManager):
         return response
 
 
+class PolicyIndex(object):
+    """
+    This class is used to hold the position, name, and global-label of every policy in a package, so policies can be
+    resolved by ID, name, or position without querying the FortiManager. The index is updated locally as policies are
+    added, updated, moved, and removed.
+    """
+
+    def __init__(self, policies):
+        """
+        :param policies: Type iterable.
+                         The policies in package order, each a dict with at least the "policyid" key.
+        """
+        self.order = []
+        self.names = {}
+        self.policies = {}
+        self.positions = {}
+        for policy in policies:
+            self.update(policy)
+
+    def get(self, policy_id):
+        """
+        This method is used to get the indexed fields of a policy.
+
+        :param policy_id: Type int.
+                          The ID of the policy.
+        :return: A dict of the policy's indexed fields. An empty dict is returned if the policy is not in the index.
+        """
+        return self.policies.get(policy_id, {})
+
+    def get_id(self, name):
+        """
+        This method is used to get the ID of a policy using the policy's name.
+
+        :param name: Type str.
+                     The name of the policy.
+        :return: The policy ID as an int. 0 is returned if a policy with the name is not in the index.
+        """
+        return self.names.get(name, 0)
+
+    def get_position(self, policy_id):
+        """
+        This method is used to get the position of a policy in the package.
+
+        :param policy_id: Type int.
+                          The ID of the policy.
+        :return: The zero based position of the policy as an int. None is returned if the policy is not in the index.
+        """
+        return self.positions.get(policy_id)
+
+    def move(self, policy_id, direction, target):
+        """
+        This method is used to move a policy in the index either before or after the target, matching a move made on
+        the FortiManager.
+
+        :param policy_id: Type int.
+                          The ID of the policy that was moved.
+        :param direction: Type str.
+                          Where the policy was placed in reference to the target. Options are "before" or "after."
+        :param target: Type int.
+                       The ID of the policy used as a reference for the move.
+        """
+        start = self.positions[policy_id]
+        self.order.remove(policy_id)
+        position = self.order.index(target)
+        if direction == "after":
+            position += 1
+        self.order.insert(position, policy_id)
+        self.reindex(min(start, position))
+
+    def reindex(self, start=0):
+        """
+        This method is used to update the positions of the policies from start to the end of the package.
+
+        :param start: Type int.
+                      The first position that changed.
+        """
+        for position in range(start, len(self.order)):
+            self.positions[self.order[position]] = position
+
+    def remove(self, policy_id):
+        """
+        This method is used to remove a deleted policy from the index.
+
+        :param policy_id: Type int.
+                          The ID of the policy that was deleted.
+        """
+        policy = self.policies.pop(policy_id, None)
+        if policy is None:
+            return
+
+        if self.names.get(policy.get("name")) == policy_id:
+            self.names.pop(policy["name"])
+        start = self.positions.pop(policy_id)
+        self.order.pop(start)
+        self.reindex(start)
+
+    def update(self, policy):
+        """
+        This method is used to add or update a policy in the index. Policies not already in the index are added to the
+        end of the package, matching where the FortiManager adds new policies.
+
+        :param policy: Type dict.
+                       The policy's configuration, which must include the "policyid" key.
+        """
+        policy_id = policy["policyid"]
+        indexed = self.policies.setdefault(policy_id, {"policyid": policy_id})
+        if policy_id not in self.positions:
+            self.positions[policy_id] = len(self.order)
+            self.order.append(policy_id)
+
+        if policy.get("name") and policy["name"] != indexed.get("name"):
+            if self.names.get(indexed.get("name")) == policy_id:
+                self.names.pop(indexed["name"])
+            self.names[policy["name"]] = policy_id
+
+        for field in ("name", "global-label"):
+            if field in policy:
+                indexed[field] = policy[field]
+
+
 def main():
     argument_spec = dict(
         adom=dict(required=True, type="str"),
+        broker_socket=dict(required=False, type="path"),
         host=dict(required=True, type="str"),
+        lease_file=dict(required=False, type="path"),
         lock=dict(default=True, type="bool"),
+        lock_timeout=dict(default=0, type="int"),
         password=dict(fallback=(env_fallback, ["ANSIBLE_NET_PASSWORD"]), no_log=True),
         provider=dict(required=False, type="dict"),
+        pool_size=dict(default=10, type="int"),
         port=dict(required=False, type="int"),
+        session_cache=dict(required=False, type="path"),
+        session_cache_ttl=dict(default=3600, type="int"),
         session_id=dict(required=False, type="str"),
         state=dict(choices=["absent", "param_absent", "present"], default="present", type="str"),
+        timeout=dict(required=False, type="int"),
         use_ssl=dict(default=True, type="bool"),
         username=dict(fallback=(env_fallback, ["ANSIBLE_NET_USERNAME"])),
         validate_certs=dict(default=False, type="bool"),
@@ -1876,6 +3077,7 @@ def main():
         permit_any_host=dict(choices=["enable", "disable"], required=False, type="str"),
         policy_id=dict(required=False, type="int"),
         policy_name=dict(required=False, type="str"),
+        policy_order=dict(required=False, type="list"),
         pool_name=dict(required=False, type="list"),
         reference_policy_id=dict(required=False, type="str"),
         reference_policy_name=dict(required=False, type="str"),
@@ -1886,7 +3088,9 @@ def main():
         status=dict(choices=["enable", "disable"], required=False, type="str")
     )
 
-    module = AnsibleModule(argument_spec, supports_check_mode=True)
+    module = AnsibleModule(argument_spec, supports_check_mode=True,
+                           mutually_exclusive=[["policy_order", "policy_id"], ["policy_order", "policy_name"],
+                                               ["policy_order", "direction"]])
     provider = module.params["provider"] or {}
 
     # prevent secret params in provider from logging
@@ -1943,12 +3147,21 @@ def main():
     # "if isinstance(v, bool) or v" should be used if a bool variable is added to args
     proposed = dict((k, v) for k, v in args.items() if v)
 
-    kwargs = dict()
+    kwargs = dict(pool_size=module.params["pool_size"], timeout=module.params["timeout"])
     if port:
         kwargs["port"] = port
 
     # validate successful login or use established session id
-    session = FMPolicy(host, username, password, use_ssl, validate_certs, adom, package)
+    session = FMPolicy(host, username, password, use_ssl, validate_certs, adom, package,
+                       session_cache=module.params["session_cache"],
+                       session_cache_ttl=module.params["session_cache_ttl"],
+                       broker_socket=module.params["broker_socket"],
+                       lock_timeout=module.params["lock_timeout"],
+                       lease_file=module.params["lease_file"],
+                       **kwargs)
+
+    # run within the workspace transaction started by fortimgr_lock if lease_file is set
+    session_id = session.join_lease(module)
     if not session_id:
         session_login = session.login()
         if not session_login.json()["result"][0]["status"]["code"] == 0:
@@ -1956,6 +3169,22 @@ def main():
     else:
         session.session = session_id
 
+    # order the listed policies without managing any single policy's configuration
+    if module.params["policy_order"]:
+        moved = session.config_order(module, module.params["policy_order"])
+        results = dict(changed=bool(moved), moved=moved)
+        if moved and module.params["lock"]:
+            results.update(dict(locked=True, saved=True, unlocked=True, lock_wait=session.lock_wait))
+
+        if not session_id:
+            session.logout()
+
+        return module.exit_json(**results)
+
+    # a single fetch of the policy index serves the name lookups and positions needed to move the policy
+    if module.params["direction"]:
+        session.get_policy_index()
+
     # add policy id if only name is provided in the module arguments
     if "name" in proposed and "policyid" not in proposed:
         proposed["policyid"] = session.get_item_name(proposed["name"])
@@ -1979,9 +3208,13 @@ def main():
     else:
         results = session.config_param_absent(module, proposed, existing)
 
+    # keep the policy index in sync with the added or updated policy
+    if session.policy_index is not None and state == "present" and results["changed"] and not module.check_mode:
+        session.policy_index.update(proposed)
+
     # if module has made it this far and lock set, then all related return values are true
     if module.params["lock"] and results["changed"]:
-        locked = dict(locked=True, saved=True, unlocked=True)
+        locked = dict(locked=True, saved=True, unlocked=True, lock_wait=session.lock_wait)
         results.update(locked)
 
     # get policy id to be used to move the policy to the correct order per module params
@@ -1995,7 +3228,8 @@ def main():
 
         # if module has made it this far and lock set, then all related return values are true
         if moved and module.params["lock"]:
-            results.update(dict(moved=moved, changed=True, locked=True, saved=True, unlocked=True))
+            results.update(dict(moved=moved, changed=True, locked=True, saved=True, unlocked=True,
+                                lock_wait=session.lock_wait))
         elif moved:
             results.update(dict(moved=moved, changed=True))
         else: